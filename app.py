@@ -1,138 +1,833 @@
 # app.py
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, Response, request
+from werkzeug.http import http_date
+import gzip
+import hashlib
 import json
 import os
-import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import leagues
+import metrics
+from profiling import profiled
+import shared_payload
+import standings_history
+
+try:
+    import brotli  # opcional: si está instalado, /api/full también se sirve en br
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl  # lock del líder (en Windows no hay: sin refresher embebido ni payload compartido)
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__)
 CACHE_FILE = "standings_cache.json"
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SEMANAS_FILE = os.path.join(DATA_DIR, "semanas.json")
+OVERRIDES_FILE = os.path.join(DATA_DIR, "manual_overrides.json")
+GAMES_INDEX_FILE = os.getenv("GAMES_INDEX_FILE", os.path.join(DATA_DIR, "games_index.json"))
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(DATA_DIR, "history"))
+SHARED_PAYLOAD_FILE = os.path.join(DATA_DIR, "full_payload.bin")
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(DATA_DIR, "updater_metrics.json"))  # del updater, cada ciclo
+
+# Cada cuántos segundos se revisan los mtimes de las entradas de /api/full (0 = en cada request)
+FULL_CACHE_CHECK_SECONDS = float(os.getenv("FULL_CACHE_CHECK_SECONDS", "1"))
+# Versiones anteriores que se recuerdan para responder /api/full?since=<versión> con un delta
+FULL_HISTORY_SIZE = int(os.getenv("FULL_HISTORY_SIZE", "16"))
+# EMBEDDED_REFRESHER=1: un worker (el que toma el lock) corre el updater adaptativo dentro de gunicorn.
+# SHARED_PAYLOAD=1 (por defecto con el refresher): el líder publica /api/full ya armado y comprimido
+# en un archivo y el resto de los workers lo lee y lo sirve tal cual. No usar --preload:
+# la elección se hace en cada worker después del fork.
+EMBEDDED_REFRESHER = os.getenv("EMBEDDED_REFRESHER", "0") == "1"
+SHARED_PAYLOAD = os.getenv("SHARED_PAYLOAD", "1" if EMBEDDED_REFRESHER else "0") == "1"
+LEADER_LOCK_FILE = os.path.join(DATA_DIR, "leader.lock")
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "15"))
+SHARED_PUBLISH_SECONDS = float(os.getenv("SHARED_PUBLISH_SECONDS", "1"))
+# Un follower que ve entradas nuevas espera hasta este tiempo a que el líder publique esa versión
+# antes de armarla por su cuenta (parseo + gzip 9 + brotli 11)
+SHARED_WAIT_SECONDS = float(os.getenv("SHARED_WAIT_SECONDS", "2"))
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+# ===== Ligas =====
+# La liga por defecto se sirve en / y /api/full (standings_cache.json + data/semanas.json);
+# cada liga de data/leagues/<slug>.json en /<slug>/ y /api/<slug>/full con sus propios archivos.
+_LEAGUE_FILES = {"sig": None, "files": {}, "state": {}}
+
+def _dir_sig(path):
+    try:
+        return tuple(sorted((e.name, e.stat().st_mtime_ns) for e in os.scandir(path) if e.name.endswith(".json")))
+    except OSError:
+        return None
+
+def _league_file_map():
+    """{slug: (cache, semanas, overrides)} de data/leagues/; se relee sólo si cambió el directorio."""
+    sig = _dir_sig(leagues.LEAGUES_DIR)
+    if sig != _LEAGUE_FILES["sig"]:
+        loaded = leagues.load_league_files()
+        _LEAGUE_FILES["files"] = {s: (lg.cache_file, lg.semanas_file, lg.overrides_file) for s, lg in loaded.items()}
+        _LEAGUE_FILES["state"] = {
+            s: {"games_index": lg.games_index_file, "history": lg.history_dir, "shared_payload": lg.shared_payload_file}
+            for s, lg in loaded.items()
+        }
+        _LEAGUE_FILES["sig"] = sig
+    return _LEAGUE_FILES["files"]
+
+def league_state_path(slug, kind):
+    """Archivo/directorio de estado (`kind`: games_index / history / shared_payload) de una liga, o None."""
+    if slug is None or slug == leagues.DEFAULT_LEAGUE:
+        return {"games_index": GAMES_INDEX_FILE, "history": HISTORY_DIR, "shared_payload": SHARED_PAYLOAD_FILE}[kind]
+    _league_file_map()
+    return _LEAGUE_FILES["state"].get(slug, {}).get(kind)
+
+def league_files(slug=None):
+    """(cache, semanas, overrides) de una liga, o None si no existe."""
+    if slug is None or slug == leagues.DEFAULT_LEAGUE:
+        return (CACHE_FILE, SEMANAS_FILE, OVERRIDES_FILE)
+    return _league_file_map().get(slug)
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", api_base="/api")
+
+@app.route("/<league>/")
+def league_index(league):
+    if league_files(league) is None:
+        return jsonify({"error": f"Unknown league: {league}"}), 404
+    return render_template("index.html", api_base=f"/api/{league}")
+
+def build_full_payload(files=None):
+    """Arma el payload completo de /api/full: cache del updater + semanas + overrides."""
+    cache_file, semanas_file, overrides_file = files or league_files()
+    with open(cache_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.pop("metrics", None)  # métricas del updater: sólo para /metrics
+
+    # ==============================
+    # Integración: Semanas/Series
+    # ==============================
+    try:
+        if semanas_file and os.path.exists(semanas_file):
+            semanas = load_json(semanas_file)
+
+            # === Resultados conciliados por el updater (todas las semanas) ===
+            leagues.apply_fixture_results(semanas, data.pop("fixture_results", None))
+
+            # === SOLO DESPUÉS aplicar overrides ===
+            # ###MARCA_OVERRIDES###
+            try:
+                if overrides_file and os.path.exists(overrides_file):
+                    leagues.apply_overrides(semanas, load_json(overrides_file))
+            except Exception as e:
+                data["overrides_error"] = str(e)
+
+            # Agregar semanas al payload
+            data["semana_actual"] = semanas.get("semana_actual")
+            data["semanas"] = semanas.get("semanas")
+
+    except Exception as _e:
+        # No interrumpir /api/full si falla la parte de semanas
+        data["semanas_error"] = str(_e)
+
+    # Última actualización
+    data["last_updated"] = datetime.fromtimestamp(os.path.getmtime(cache_file)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+    return data
+
+
+# ===== Cache en proceso de /api/full =====
+# Guarda los bytes ya serializados (y comprimidos) de la respuesta, invalidados por los mtimes de
+# las 3 entradas. Entre revisiones (FULL_CACHE_CHECK_SECONDS) un request es solo leer el dict
+# y escribir al socket. Cada versión lleva un ETag fuerte (hash del cuerpo) y su Last-Modified
+# (hora en que cambió el cuerpo: un override borrado o un snapshot restaurado también lo adelantan).
+# Una entrada por liga.
+_FULL_CACHE = {}   # liga -> {"entry", "checked_at"}
+_FULL_LOCK = threading.Lock()
+_FULL_SEQ = [0]    # contador del proceso: sube cada vez que cambia el cuerpo de alguna liga (ver _entry_seq)
+
+def _file_sig(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _full_inputs_key(files):
+    return tuple(_file_sig(path) if path else None for path in files)
+
+def _build_full_entry(key, files, slug):
+    payload = build_full_payload(files)
+    body = (app.json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+    version = hashlib.sha1(body).hexdigest()[:20]
+    encoded = {"gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(body, quality=11)
+    return {
+        "key": key,
+        "league": slug,
+        "version": version,
+        "payload": payload,
+        "body": body,
+        "encoded": encoded,
+        "last_modified": int(time.time()),   # cuándo cambió el cuerpo (ver _sequenced), no el mtime de las entradas
+    }
+
+_SHARED_READERS = {}   # liga -> SharedPayload
+
+def _shared_entry(slug, key):
+    """Entrada publicada por el líder si corresponde a las mismas entradas (`key`); si no, None."""
+    if not SHARED_PAYLOAD:
+        return None
+    path = league_state_path(slug, "shared_payload")
+    if path is None:
+        return None
+    reader = _SHARED_READERS.get(slug)
+    if reader is None or reader.path != path:
+        reader = _SHARED_READERS[slug] = shared_payload.SharedPayload(path)
+    entry = reader.entry()
+    if entry is None or entry["key"] != shared_payload.jsonable_key(key):
+        return None
+    return dict(entry, key=key)
+
+def _entry_payload(entry):
+    """Payload de una entrada; las del archivo compartido traen sólo bytes y se parsean al pedir un delta."""
+    if "payload" not in entry:
+        entry["payload"] = json.loads(entry["body"])
+    return entry["payload"]
+
+def _await_shared_entry(slug, key):
+    """Entrada compartida para `key`; un follower espera hasta SHARED_WAIT_SECONDS a que el líder la publique."""
+    deadline = time.monotonic() + SHARED_WAIT_SECONDS
+    while True:
+        entry = _shared_entry(slug, key)
+        follower = SHARED_PAYLOAD and _LEADER["started"] and _LEADER["fd"] is None
+        if entry is not None or not follower or time.monotonic() >= deadline:
+            return entry
+        time.sleep(0.05)
+
+def _sequenced(entry, previous):
+    """
+    `entry` con su `seq` y `last_modified`: los de la anterior si el cuerpo es el mismo; si cambió, `seq`
+    nuevo y la hora de esta reconstrucción (bajo _FULL_LOCK).
+    """
+    if previous is not None and previous["version"] == entry["version"]:
+        return dict(entry, seq=previous["seq"], last_modified=previous["last_modified"])
+    _FULL_SEQ[0] += 1
+    return dict(entry, seq=_FULL_SEQ[0])
+
+def get_full_entry(slug=None, fresh=False):
+    """
+    Versión vigente de /api/full (de la liga `slug`); se reconstruye solo si cambió alguna entrada (un hilo a la vez).
+    `fresh`: revisa las entradas aunque no haya pasado FULL_CACHE_CHECK_SECONDS.
+    """
+    slug = slug or leagues.DEFAULT_LEAGUE
+    state = _FULL_CACHE.setdefault(slug, {"entry": None, "checked_at": 0.0})
+    entry = state["entry"]
+    now = time.monotonic()
+    if not fresh and entry is not None and now - state["checked_at"] < FULL_CACHE_CHECK_SECONDS:
+        return entry
+    files = league_files(slug)
+    key = _full_inputs_key(files)
+    if entry is not None and entry["key"] == key:
+        state["checked_at"] = now
+        return entry
+    # Con SHARED_PAYLOAD, la versión que ya armó (o está por publicar) el líder para estas mismas
+    # entradas; se espera fuera del lock para no frenar a las otras ligas ni a los deltas
+    shared = _await_shared_entry(slug, key)
+    with _FULL_LOCK:
+        # Otro hilo pudo reconstruir mientras esperábamos
+        entry = state["entry"]
+        if entry is not None and entry["key"] == key:
+            return entry
+        entry = _sequenced(shared or _build_full_entry(key, files, slug), state["entry"])
+        history = _FULL_HISTORY.setdefault(slug, OrderedDict())
+        history[entry["version"]] = entry
+        while len(history) > FULL_HISTORY_SIZE:
+            history.popitem(last=False)
+        state["entry"] = entry
+        state["checked_at"] = time.monotonic()
+        return entry
+
+# ===== Deltas: /api/full?since=<versión> =====
+# Con la versión que ya tiene el cliente (ETag / id del SSE) se manda sólo lo que cambió:
+# filas de la tabla, juegos de hoy nuevos y fixtures cuyo estado/resultado cambió.
+# Si la versión ya no está en _FULL_HISTORY (muy vieja u otro worker), va el payload completo.
+_FULL_HISTORY = {}              # liga -> OrderedDict(versión -> entry)
+_DELTA_CACHE = OrderedDict()    # (desde, hasta) -> bytes
+
+def _row_key(row):
+    return row.get("team") or row.get("user")
+
+def compute_delta(old, new):
+    delta = {}
+
+    # Tabla: filas cambiadas (por equipo) + orden sólo si cambió
+    old_rows = {_row_key(r): r for r in old.get("standings") or []}
+    new_rows = new.get("standings") or []
+    changed = [r for r in new_rows if old_rows.get(_row_key(r)) != r]
+    if changed:
+        delta["standings_changed"] = changed
+    new_order = [_row_key(r) for r in new_rows]
+    if new_order != [_row_key(r) for r in old.get("standings") or []]:
+        delta["standings_order"] = new_order
+
+    # Juegos de hoy: si sólo se agregaron, van los nuevos; si algo salió (cambio de día), la lista completa
+    old_games, new_games = old.get("games_today") or [], new.get("games_today") or []
+    if old_games != new_games:
+        if new_games[: len(old_games)] == old_games:
+            delta["games_today_added"] = new_games[len(old_games):]
+        else:
+            delta["games_today"] = new_games
+
+    # Semanas: fixtures con estado/resultado distinto; si cambió la estructura, las semanas completas
+    old_sem, new_sem = old.get("semanas") or {}, new.get("semanas") or {}
+    if old_sem != new_sem:
+        same_shape = old_sem.keys() == new_sem.keys() and all(
+            len(old_sem[k]) == len(new_sem[k])
+            and all(
+                (a.get("local"), a.get("visitante")) == (b.get("local"), b.get("visitante"))
+                for a, b in zip(old_sem[k], new_sem[k])
+            )
+            for k in new_sem
+        )
+        if same_shape:
+            delta["fixtures_changed"] = [
+                {"semana": k, "pos": i, "estado": b.get("estado"), "resultado": b.get("resultado")}
+                for k in new_sem
+                for i, (a, b) in enumerate(zip(old_sem[k], new_sem[k]))
+                if a != b
+            ]
+        else:
+            delta["semanas"] = new_sem
+
+    # Resto de claves de primer nivel (last_updated, semana_actual, errores...)
+    for k, v in new.items():
+        if k not in ("standings", "games_today", "semanas") and old.get(k) != v:
+            delta[k] = v
+    delta["removed"] = [k for k in old if k not in new]
+    if not delta["removed"]:
+        del delta["removed"]
+    return delta
+
+def get_delta_body(since, entry):
+    """Bytes del delta since -> entry, o None si `since` no está en el historial."""
+    ck = (since, entry["version"])
+    body = _DELTA_CACHE.get(ck)
+    if body is not None:
+        return body
+    old = _FULL_HISTORY.get(entry["league"], {}).get(since)
+    if old is None:
+        return None
+    delta = compute_delta(_entry_payload(old), _entry_payload(entry))
+    delta.update(delta=True, since=since, version=entry["version"])
+    body = (app.json.dumps(delta, separators=(",", ":")) + "\n").encode("utf-8")
+    with _FULL_LOCK:
+        _DELTA_CACHE[ck] = body
+        while len(_DELTA_CACHE) > FULL_HISTORY_SIZE * 4:
+            _DELTA_CACHE.popitem(last=False)
+    return body
+
+def _not_modified(entry):
+    """If-None-Match manda sobre If-Modified-Since (RFC 9110)."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(entry["version"]) or "*" in request.if_none_match
+    ims = request.if_modified_since
+    return ims is not None and entry["last_modified"] <= int(ims.timestamp())
+
+def full_response(entry):
+    """
+    Respuesta HTTP para una versión: 304 si el cliente ya la tiene; delta si pidió ?since= de una
+    versión conocida; si no, el cuerpo completo precomprimido que acepte.
+    """
+    headers = {
+        "ETag": f'"{entry["version"]}"',
+        "Last-Modified": http_date(entry["last_modified"]),
+        "Cache-Control": "no-cache",  # el navegador guarda, pero revalida siempre
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(entry):
+        return Response(status=304, headers=headers)
+    since = request.args.get("since")
+    if since:
+        delta = get_delta_body(since, entry)
+        if delta is not None:
+            return Response(delta, mimetype="application/json", headers=headers)
+    body, encoding = entry["body"], None
+    for enc in ("br", "gzip"):
+        if enc in entry["encoded"] and request.accept_encodings[enc]:
+            body, encoding = entry["encoded"][enc], enc
+            break
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype="application/json", headers=headers)
+
+def _current_entry(slug):
+    """(entry, None) de la liga, o (None, respuesta de error)."""
+    files = league_files(slug)
+    if files is None:
+        return None, (jsonify({"error": f"Unknown league: {slug}"}), 404)
+    if not os.path.exists(files[0]):
+        return None, (jsonify({"error": "Data not available yet, please try again in a few minutes."}), 503)
+    try:
+        return get_full_entry(slug), None
+    except Exception as e:
+        return None, (jsonify({"error": f"Failed to read cached data: {e}"}), 500)
 
 @app.route("/api/full")
+@profiled("api_full")
 def api_full():
-    if not os.path.exists(CACHE_FILE):
-        return jsonify({"error": "Data not available yet, please try again in a few minutes."}), 503
+    entry, error = _current_entry(None)
+    return error or full_response(entry)
+
+@app.route("/api/<league>/full")
+@profiled("api_full")
+def api_league_full(league):
+    entry, error = _current_entry(league)
+    return error or full_response(entry)
+
+# ===== Juegos por equipo y enfrentamientos =====
+# El updater escribe games_index.json (juegos contados por equipo y por par de equipos); la web lo
+# carga una vez por cambio de archivo y cada request es una búsqueda en un dict + un slice.
+GAMES_PAGE_SIZE = int(os.getenv("GAMES_PAGE_SIZE", "20"))
+GAMES_PAGE_MAX = 100
+_GAME_INDEX = {}   # liga -> {"sig", "data"}
+
+def get_game_index(slug=None):
+    """Índice de juegos de la liga, releído sólo si cambió el archivo; None si la liga no existe."""
+    path = league_state_path(slug, "games_index")
+    if path is None:
+        return None
+    slug = slug or leagues.DEFAULT_LEAGUE
+    sig = _file_sig(path)
+    cached = _GAME_INDEX.get(slug)
+    if cached is None or cached["sig"] != sig:
+        data = load_json(path) if sig else {"teams": {}, "h2h": {}}
+        cached = _GAME_INDEX[slug] = {"sig": sig, "data": data}
+    return cached["data"]
+
+def _norm_team(s):
+    return (s or "").strip().lower()
 
+def _games_response(slug, team):
+    index, error = _game_index_or_error(slug)
+    if error:
+        return error
+    games = index["teams"].get(_norm_team(team))
+    if games is None:
+        return jsonify({"error": f"Unknown team: {team}"}), 404
     try:
-        with open(CACHE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", GAMES_PAGE_SIZE)), 1), GAMES_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "page / per_page must be integers"}), 400
+    start = (page - 1) * per_page
+    return jsonify({
+        "team": team,
+        "total": len(games),
+        "page": page,
+        "per_page": per_page,
+        "pages": (len(games) + per_page - 1) // per_page,
+        "games": games[start:start + per_page],
+    })
 
-        # ==============================
-        # Integración: Semanas/Series
-        # ==============================
-        try:
-            data_dir = os.path.join(os.path.dirname(__file__), "data")
-            semanas_path = os.path.join(data_dir, "semanas.json")
-            if os.path.exists(semanas_path):
-                semanas = load_json(semanas_path)
-
-                # Normalizamos lista de juegos jugados desde cache
-                games_today = data.get("games_today", []) or []
-                parsed_games = []
-
-                def split_last(txt):
-                    txt = txt.strip()
-                    i = txt.rfind(" ")
-                    if i == -1:
-                        return {"name": txt, "score": ""}
-                    return {"name": txt[:i], "score": txt[i + 1 :]}
-
-                for g in games_today:
-                    if isinstance(g, str):
-                        norm = (g or "").replace("\xa0", " ").strip()
-                        parts = [p.strip() for p in norm.split(" - ")]
-                        if len(parts) >= 4:
-                            home = split_last(parts[0])
-                            away = split_last(parts[1])
-                            try:
-                                hscore = int(re.sub(r"[^0-9-]", "", home["score"]))
-                            except:
-                                hscore = None
-                            try:
-                                ascore = int(re.sub(r"[^0-9-]", "", away["score"]))
-                            except:
-                                ascore = None
-                            parsed_games.append(
-                                {
-                                    "home": home["name"],
-                                    "away": away["name"],
-                                    "home_score": hscore,
-                                    "away_score": ascore,
-                                }
-                            )
-                    elif isinstance(g, dict):
-                        parsed_games.append(
-                            {
-                                "home": g.get("home_team"),
-                                "away": g.get("away_team"),
-                                "home_score": g.get("home_score"),
-                                "away_score": g.get("away_score"),
-                            }
-                        )
-
-                # === Actualizar semana actual con marcadores "JUGADO" ===
-                semana_actual = str(semanas.get("semana_actual"))
-                if semana_actual in semanas.get("semanas", {}):
-                    used_games = []
-                    for juego in semanas["semanas"][semana_actual]:
-                        if juego.get("estado") == "Pendiente":
-                            for g in parsed_games:
-                                if g in used_games:
-                                    continue
-                                if (
-                                    g["home"] == juego["local"]
-                                    and g["away"] == juego["visitante"]
-                                    and g["home_score"] is not None
-                                    and g["away_score"] is not None
-                                ):
-                                    juego["estado"] = "JUGADO"
-                                    juego["resultado"] = f"{g['home_score']}-{g['away_score']}"
-                                    used_games.append(g)
-                                    break
-
-                # === SOLO DESPUÉS aplicar overrides ===
-                # ###MARCA_OVERRIDES###
-                try:
-                    overrides_path = os.path.join(data_dir, "manual_overrides.json")
-                    if os.path.exists(overrides_path):
-                        overrides = load_json(overrides_path)
-                        for key, val in overrides.items():
-                            for juego in semanas["semanas"].get(semana_actual, []):
-                                if (
-                                    juego.get("local") == val.get("local")
-                                    and juego.get("visitante") == val.get("visitante")
-                                ):
-                                    if "resultado" in val:
-                                        juego["resultado"] = val["resultado"]
-                                    if "estado" in val:
-                                        juego["estado"] = val["estado"]
-                except Exception as e:
-                    data["overrides_error"] = str(e)
-
-                # Agregar semanas al payload
-                data["semana_actual"] = semanas.get("semana_actual")
-                data["semanas"] = semanas.get("semanas")
-
-        except Exception as _e:
-            # No interrumpir /api/full si falla la parte de semanas
-            data["semanas_error"] = str(_e)
-
-        # Última actualización
-        data["last_updated"] = datetime.fromtimestamp(os.path.getmtime(CACHE_FILE)).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
+def _h2h_response(slug, a, b):
+    index, error = _game_index_or_error(slug)
+    if error:
+        return error
+    for team in (a, b):
+        if _norm_team(team) not in index["teams"]:
+            return jsonify({"error": f"Unknown team: {team}"}), 404
+    games = index["h2h"].get("|".join(sorted((_norm_team(a), _norm_team(b)))), [])
+    wins_a = sum(1 for g in games if _norm_team(g["winner"]) == _norm_team(a))
+    return jsonify({"teams": [a, b], "wins": [wins_a, len(games) - wins_a], "total": len(games), "games": games})
 
-        return jsonify(data)
+def _game_index_or_error(slug):
+    try:
+        index = get_game_index(slug)
     except Exception as e:
-        return jsonify({"error": f"Failed to read cached data: {e}"}), 500
+        return None, (jsonify({"error": f"Failed to read game index: {e}"}), 500)
+    if index is None:
+        return None, (jsonify({"error": f"Unknown league: {slug}"}), 404)
+    if not index["teams"]:
+        return None, (jsonify({"error": "Data not available yet, please try again in a few minutes."}), 503)
+    return index, None
+
+@app.route("/api/team/<team>/games")
+def api_team_games(team):
+    return _games_response(None, team)
+
+@app.route("/api/<league>/team/<team>/games")
+def api_league_team_games(league, team):
+    return _games_response(league, team)
+
+@app.route("/api/h2h/<a>/<b>")
+def api_h2h(a, b):
+    return _h2h_response(None, a, b)
+
+@app.route("/api/<league>/h2h/<a>/<b>")
+def api_league_h2h(league, a, b):
+    return _h2h_response(league, a, b)
+
+# ===== Historia de la tabla: /api/history =====
+# ?team=<equipo>&from=<fecha>&to=<fecha> (hora Chile, "YYYY-MM-DD" o "YYYY-MM-DD HH:MM:SS")
+# ?at=<fecha>: la tabla vigente en ese momento.
+# Lee standings_history desde el keyframe anterior a `from`, no el archivo completo.
+_TZ_SCL = ZoneInfo("America/Santiago")
+
+def _parse_local(value, end_of_day=False):
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            dt = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end_of_day:
+            dt = dt.replace(hour=23, minute=59, second=59)
+        return int(dt.replace(tzinfo=_TZ_SCL).timestamp())
+    raise ValueError(f"fecha inválida: {value}")
+
+def _fmt_local(ts):
+    return datetime.fromtimestamp(ts, _TZ_SCL).strftime("%Y-%m-%d %H:%M:%S")
+
+def _wlp(v):
+    return {"wins": v[0], "losses": v[1], "points": v[2]}
+
+def _history_response(slug):
+    path = league_state_path(slug, "history")
+    if path is None:
+        return jsonify({"error": f"Unknown league: {slug}"}), 404
+    store = standings_history.HistoryStore(path)
+    team = request.args.get("team")
+    try:
+        at = _parse_local(request.args.get("at"), end_of_day=True)
+        start = _parse_local(request.args.get("from"))
+        end = _parse_local(request.args.get("to"), end_of_day=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if at is not None:
+        table = {}
+        for _ts, values in store.read(start=at, end=at, team=team):
+            table.update(values)
+        return jsonify({"at": _fmt_local(at), "standings": {t: _wlp(v) for t, v in table.items()}})
+    series = store.read(start=start, end=end, team=team)
+    if team:
+        return jsonify({"team": team, "points": [
+            dict(_wlp(v), t=_fmt_local(ts)) for ts, values in series for v in values.values()
+        ]})
+    return jsonify({"points": [
+        {"t": _fmt_local(ts), "standings": {t: _wlp(v) for t, v in values.items()}} for ts, values in series
+    ]})
+
+@app.route("/api/history")
+def api_history():
+    return _history_response(None)
+
+@app.route("/api/<league>/history")
+def api_league_history(league):
+    return _history_response(league)
+
+# ===== Push en vivo: /api/stream (Server-Sent Events) =====
+# Un solo watcher por proceso revisa las entradas de /api/full (los mismos mtimes que usa el cache)
+# y despierta a todos los clientes conectados; los clientes no revisan nada por su cuenta.
+# Ojo: con gunicorn gthread cada stream ocupa un hilo, por eso hay tope por proceso; el resto de los
+# clientes recibe 503 y la página cae a polling (barato gracias al ETag/304 de /api/full).
+# Dimensionar: SSE_MAX_CLIENTS = --threads menos los hilos que quedan para requests normales
+# (procfile: --threads 32 -> 24 streams + 8 hilos libres por worker; clientes en vivo = workers x 24).
+# Los clientes sólo reciben versiones más nuevas que la que tienen (orden por `seq`, ver _entry_seq).
+SSE_WATCH_SECONDS = float(os.getenv("SSE_WATCH_SECONDS", "1"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "24"))       # por proceso (< --threads de gunicorn)
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "300"))    # luego el navegador reconecta solo
+SSE_RETRY_MS = 5000
+
+def _entry_seq(entry):
+    """
+    Orden de las versiones de /api/full: sube con cada reconstrucción que cambia el cuerpo (no el mtime
+    de las entradas: borrar un override o volver a un snapshot anterior también es una versión nueva).
+    """
+    return entry["seq"]
+
+class FullBroadcaster:
+    def __init__(self, slug=None):
+        self.slug = slug
+        self._cond = threading.Condition()
+        self._entry = None
+        self._clients = 0
+        self._thread = None
+
+    def ensure_watcher(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="sse-watcher", daemon=True)
+                self._thread.start()
+
+    def _watch(self):
+        while True:
+            try:
+                files = league_files(self.slug)
+                entry = get_full_entry(self.slug) if files and os.path.exists(files[0]) else None
+            except Exception:
+                entry = None
+            if entry is not None and (self._entry is None or _entry_seq(entry) > _entry_seq(self._entry)):
+                with self._cond:
+                    self._entry = entry
+                    self._cond.notify_all()
+            time.sleep(SSE_WATCH_SECONDS)
+
+    def acquire(self):
+        with self._cond:
+            if self._clients >= SSE_MAX_CLIENTS:
+                return False
+            self._clients += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._clients -= 1
+
+    def wait_for_change(self, seq, timeout):
+        """Espera hasta `timeout` segundos una versión más nueva que `seq`; devuelve la vigente (o None)."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._entry is not None and _entry_seq(self._entry) > seq, timeout
+            )
+            return self._entry
+
+_BROADCASTERS = {}   # liga -> FullBroadcaster (uno por liga con clientes)
+_BROADCASTERS_LOCK = threading.Lock()
+
+def get_broadcaster(slug=None):
+    slug = slug or leagues.DEFAULT_LEAGUE
+    with _BROADCASTERS_LOCK:
+        if slug not in _BROADCASTERS:
+            _BROADCASTERS[slug] = FullBroadcaster(slug)
+        return _BROADCASTERS[slug]
+
+def _sse_event(entry, since=None):
+    """Evento `delta` si se conoce la versión anterior del cliente; si no, `full`."""
+    body = get_delta_body(since, entry) if since else None
+    kind = "delta" if body is not None else "full"
+    data = (body or entry["body"]).decode("utf-8").rstrip("\n")  # JSON compacto: una sola línea
+    return f"id: {entry['version']}\nevent: {kind}\ndata: {data}\n\n"
+
+@app.route("/api/stream")
+def api_stream():
+    return _stream(None)
+
+@app.route("/api/<league>/stream")
+def api_league_stream(league):
+    return _stream(league)
+
+def _stream(slug):
+    entry, error = _current_entry(slug)
+    if error:
+        return error
+    broadcaster = get_broadcaster(slug)
+    if not broadcaster.acquire():
+        return jsonify({"error": "Too many live clients, use /api/full"}), 503
+    broadcaster.ensure_watcher()
+    last_seen = request.headers.get("Last-Event-ID")
+
+    def generate():
+        try:
+            version, seq = entry["version"], _entry_seq(entry)
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if last_seen != version:
+                yield _sse_event(entry, since=last_seen)
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                # El watcher puede ir atrasado respecto de `entry`: sólo se empuja lo más nuevo
+                current = broadcaster.wait_for_change(seq, SSE_HEARTBEAT_SECONDS)
+                if current is not None and _entry_seq(current) > seq:
+                    seq = _entry_seq(current)
+                    if current["version"] != version:   # entradas reescritas sin cambios: nada que mandar
+                        event = _sse_event(current, since=version)
+                        version = current["version"]
+                        yield event
+                        continue
+                yield ": ping\n\n"
+        finally:
+            broadcaster.release()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ===== Métricas: /metrics (formato texto de Prometheus) =====
+# - Del updater (otro proceso): METRICS_FILE, reescrito en cada ciclo (fases del último ciclo,
+#   latencia/status/reintentos de la API y detalle por (usuario, página)).
+# - De la web: latencia y status de cada endpoint, por proceso (con varios workers, cada scrape
+#   ve el worker que lo atendió).
+_HTTP_LATENCY = {}              # endpoint -> Histogram
+_HTTP_REQUESTS = {}             # (endpoint, status) -> n
+_HTTP_LOCK = threading.Lock()
+_UPDATER_METRICS = {"sig": None, "data": None}
+_CACHE_VERSION = {"sig": None, "version": None}
+
+@app.before_request
+def _start_timer():
+    request.environ["metrics.started"] = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    started = request.environ.get("metrics.started")
+    endpoint = request.endpoint or "unknown"
+    if started is not None and endpoint not in ("api_stream", "api_league_stream", "metrics_endpoint"):
+        with _HTTP_LOCK:
+            hist = _HTTP_LATENCY.setdefault(endpoint, metrics.Histogram())
+            key = (endpoint, response.status_code)
+            _HTTP_REQUESTS[key] = _HTTP_REQUESTS.get(key, 0) + 1
+        hist.observe(time.perf_counter() - started)
+    return response
+
+def _updater_metrics():
+    """(metrics del último ciclo, versión del cache publicado); cada archivo se relee sólo si cambió."""
+    sig = _file_sig(METRICS_FILE)
+    if sig != _UPDATER_METRICS["sig"]:
+        try:
+            _UPDATER_METRICS["data"] = load_json(METRICS_FILE)
+        except (OSError, ValueError):
+            _UPDATER_METRICS["data"] = {}
+        _UPDATER_METRICS["sig"] = sig
+    sig = _file_sig(CACHE_FILE)
+    if sig != _CACHE_VERSION["sig"]:
+        try:
+            _CACHE_VERSION["version"] = load_json(CACHE_FILE).get("version")
+        except (OSError, ValueError, AttributeError):
+            _CACHE_VERSION["version"] = None
+        _CACHE_VERSION["sig"] = sig
+    return _UPDATER_METRICS["data"] or {}, _CACHE_VERSION["version"]
+
+def _status_value(status):
+    return status if isinstance(status, int) else 0
+
+@app.route("/metrics")
+def metrics_endpoint():
+    upd, version = _updater_metrics()
+    ages = []
+    for slug, files in [(leagues.DEFAULT_LEAGUE, league_files())] + sorted(_league_file_map().items()):
+        sig = _file_sig(files[0])
+        ages.append(({"league": slug}, round(time.time() - sig[0] / 1e9, 3) if sig else None))
+    upstream = upd.get("upstream") or {}
+    pages = upd.get("pages") or []
+    families = [
+        ("standings_cache_age_seconds", "gauge", "Segundos desde la última publicación del cache de cada liga",
+         ages),
+        ("standings_cache_version", "gauge", "Versión del snapshot publicado", [({}, version)]),
+        ("standings_worker_leader", "gauge", "1 si este worker tiene el lock de líder (refresher / payload compartido)",
+         [({"pid": os.getpid()}, _LEADER["fd"] is not None)]),
+        ("standings_refresh_duration_seconds", "gauge", "Duración del último ciclo del updater",
+         [({}, upd.get("duration_seconds"))]),
+        ("standings_refresh_phase_seconds", "gauge", "Duración de cada fase del último ciclo",
+         [({"phase": k}, v) for k, v in sorted((upd.get("phases") or {}).items())]),
+        ("standings_refresh_cycles_total", "counter", "Ciclos del updater desde que arrancó",
+         [({"result": k}, v) for k, v in sorted((upd.get("cycles") or {}).items())]),
+        ("standings_upstream_attempts_total", "counter", "Intentos contra la API por status (error = sin respuesta)",
+         [({"status": k}, v) for k, v in sorted((upstream.get("status") or {}).items())]),
+        ("standings_upstream_retries_total", "counter", "Reintentos contra la API", [({}, upstream.get("retries"))]),
+        ("standings_upstream_throttled_total", "counter", "Respuestas 429 de la API", [({}, upstream.get("throttled"))]),
+        ("standings_upstream_failures_total", "counter", "Pedidos que agotaron los reintentos", [({}, upstream.get("failures"))]),
+        ("standings_upstream_short_circuited_total", "counter", "Pedidos rechazados por el circuit breaker",
+         [({}, upstream.get("short_circuited"))]),
+        ("standings_upstream_breaker_open", "gauge", "1 si el circuit breaker no está cerrado",
+         [({"state": upstream.get("breaker") or "unknown"}, upstream.get("breaker") not in (None, "closed"))]),
+        ("standings_upstream_page_seconds", "gauge", "Duración del último pedido por (usuario, página), con reintentos",
+         [({"user": p["user"], "page": p["page"]}, p.get("seconds")) for p in pages]),
+        ("standings_upstream_page_attempts", "gauge", "Intentos del último pedido por (usuario, página)",
+         [({"user": p["user"], "page": p["page"]}, p.get("attempts")) for p in pages]),
+        ("standings_upstream_page_status", "gauge", "Status HTTP del último pedido por (usuario, página) (0 = sin respuesta)",
+         [({"user": p["user"], "page": p["page"]}, _status_value(p.get("status"))) for p in pages]),
+    ]
+    if upstream.get("latency"):
+        families.append(("standings_upstream_latency_seconds", "histogram", "Latencia por intento contra la API",
+                         [({}, upstream["latency"])]))
+    with _HTTP_LOCK:
+        latency = {k: h.snapshot() for k, h in _HTTP_LATENCY.items()}
+        counts = dict(_HTTP_REQUESTS)
+    families.append(("standings_http_request_duration_seconds", "histogram", "Latencia de los endpoints de la web",
+                     [({"endpoint": k}, v) for k, v in sorted(latency.items())]))
+    families.append(("standings_http_requests_total", "counter", "Requests atendidos por endpoint y status",
+                     [({"endpoint": e, "status": st}, n) for (e, st), n in sorted(counts.items())]))
+    return Response(metrics.render(families), mimetype="text/plain; version=0.0.4")
+
+# ===== Líder entre los workers: refresher embebido + payload compartido =====
+# Cada worker intenta tomar LEADER_LOCK_FILE (flock, no bloqueante); el que lo obtiene lo mantiene
+# mientras viva. Si ese worker muere, el sistema libera el lock y otro lo toma en el próximo intento.
+_LEADER = {"started": False, "fd": None}
+
+def _try_lead():
+    os.makedirs(os.path.dirname(LEADER_LOCK_FILE), exist_ok=True)
+    fd = os.open(LEADER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _LEADER["fd"] = fd  # abierto mientras viva el proceso
+    return True
+
+_PUBLISH_NOW = threading.Event()   # el refresher embebido avisa apenas escribe (ver update_cache.PUBLISH_HOOKS)
+
+def _publish_shared_loop():
+    """Publica /api/full de cada liga en su archivo compartido cuando cambia de versión."""
+    published = {}
+    while True:
+        for slug in [leagues.DEFAULT_LEAGUE] + sorted(_league_file_map()):
+            files = league_files(slug)
+            try:
+                if files and os.path.exists(files[0]):
+                    entry = get_full_entry(slug, fresh=True)
+                    if published.get(slug) != entry["version"]:
+                        shared_payload.write_entry(league_state_path(slug, "shared_payload"), entry)
+                        published[slug] = entry["version"]
+            except Exception as e:
+                print(f"[WARN] No se pudo publicar el payload compartido de {slug}: {e}")
+        _PUBLISH_NOW.wait(SHARED_PUBLISH_SECONDS)
+        _PUBLISH_NOW.clear()
+
+def _leader_loop():
+    while not _try_lead():
+        time.sleep(LEADER_RETRY_SECONDS)
+    print(f"Worker {os.getpid()} es el líder (refresher={EMBEDDED_REFRESHER}, payload compartido={SHARED_PAYLOAD}).")
+    if SHARED_PAYLOAD:
+        threading.Thread(target=_publish_shared_loop, name="shared-payload", daemon=True).start()
+    if EMBEDDED_REFRESHER:
+        import update_cache  # sólo el líder carga el pipeline de descarga
+        if SHARED_PAYLOAD:
+            update_cache.PUBLISH_HOOKS.append(_PUBLISH_NOW.set)
+        while True:
+            try:
+                update_cache.run_adaptive_loop()
+            except Exception as e:
+                print(f"ERROR en el refresher embebido: {e}")
+            time.sleep(LEADER_RETRY_SECONDS)
+
+def start_leader_election():
+    if _LEADER["started"] or not (EMBEDDED_REFRESHER or SHARED_PAYLOAD):
+        return
+    if fcntl is None:
+        print("[WARN] Sin fcntl (Windows): EMBEDDED_REFRESHER / SHARED_PAYLOAD desactivados.")
+        return
+    _LEADER["started"] = True
+    threading.Thread(target=_leader_loop, name="leader", daemon=True).start()
+
+start_leader_election()
 
 if __name__ == "__main__":
     app.run(debug=True)
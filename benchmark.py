@@ -0,0 +1,355 @@
+# benchmark.py
+# Benchmark offline del pipeline completo contra un stub local de la API game_history.
+# - El stub sirve historiales sintéticos (o grabados) con latencia y tasa de error configurables.
+# - Mide compute_rows(), games_played_today_scl() y update_data_cache() de punta a punta:
+#   tiempo de pared, requests a la API (contados en el stub) y memoria pico (tracemalloc).
+# - Escenarios: cold (ledger vacío), warm (sin juegos nuevos) y new (llegan juegos nuevos).
+# - Guarda resultados como baseline y compara contra uno anterior para ver regresiones.
+#
+# Uso:
+#   python benchmark.py                                  # 16 jugadores, sin latencia
+#   python benchmark.py --players 200 --latency-ms 80 --error-rate 0.02
+#   python benchmark.py --data historiales.json          # {username: [juegos, más nuevo primero]}
+#   python benchmark.py --from-capture out/captures.jsonl.gz
+#   python benchmark.py --save main                      # guarda benchmarks/main.json
+#   python benchmark.py --compare main                   # compara (sale con 1 si hay regresiones)
+import argparse, contextlib, io, json, os, random, shutil, statistics, sys, tempfile, threading, time, tracemalloc
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BASE_DIR, "benchmarks")
+REGRESSION_THRESHOLD = 0.20   # +20% en tiempo, requests o memoria = regresión...
+# ...siempre que la diferencia absoluta también supere esto (fases de milisegundos y ruido de la máquina)
+REGRESSION_MIN_DELTA = {
+    "seconds": float(os.getenv("BENCH_MIN_SECONDS", "0.05")),
+    "peak_mb": float(os.getenv("BENCH_MIN_MB", "1")),
+    "requests": 0,
+}
+
+
+# ===== Datos =====
+def synthetic_histories(players, games_per_player, seed=1, today_games=10):
+    """
+    Historiales sintéticos {username: [juegos]} (más nuevo primero) con la forma de la API:
+    mayoría LEAGUE entre miembros, algo de CPU / no miembros / otros modos, y `today_games` juegos recientes.
+    """
+    rnd = random.Random(seed)
+    league = [(f"bench_player_{i:03d}", f"Team {i:03d}") for i in range(players)]
+    hist = {u: [] for u, _t in league}
+    now = datetime.utcnow()
+    start = datetime(2025, 9, 20)
+    total = players * games_per_player // 2
+    span = (now - start - timedelta(hours=6)).total_seconds()
+    gid = 5_000_000
+    for i in range(total):
+        gid += rnd.randint(1, 40)
+        if i >= total - today_games:
+            t = now - timedelta(minutes=15 * (total - i))
+        else:
+            t = start + timedelta(seconds=span * i / total)
+        (hu, ht), (au, at) = rnd.sample(league, 2)
+        an = au
+        kind = rnd.random()
+        if kind < 0.08:
+            an = "CPU"
+        elif kind < 0.12:
+            an = "someone_else"
+        hr, ar = rnd.randint(0, 9), rnd.randint(0, 9)
+        if hr == ar:
+            hr += 1
+        g = {
+            "id": str(gid),
+            "game_mode": rnd.choice(["LEAGUE"] * 8 + ["EXHIBITION", "RANKED"]),
+            "display_date": t.strftime("%m/%d/%Y %H:%M:%S"),
+            "home_full_name": ht, "away_full_name": at,
+            "home_name": hu, "away_name": an,
+            "home_display_result": "W" if hr > ar else "L",
+            "away_display_result": "W" if ar > hr else "L",
+            "home_runs": hr, "away_runs": ar,
+            "display_pitcher_info": f"P{rnd.randint(1, 99)}",
+        }
+        hist[hu].append(g)
+        if an == au:
+            hist[au].append(g)
+    for u in hist:
+        hist[u].reverse()
+    return league, hist
+
+def add_new_games(league, hist, n, seed=2):
+    """Agrega `n` juegos LEAGUE recién jugados al principio de los historiales."""
+    rnd = random.Random(seed)
+    gid = max(int(g["id"]) for gs in hist.values() for g in gs if str(g.get("id", "")).isdigit()) + 1
+    now = datetime.utcnow()
+    for i in range(n):
+        (hu, ht), (au, at) = rnd.sample(league, 2)
+        g = {
+            "id": str(gid + i), "game_mode": "LEAGUE",
+            "display_date": (now - timedelta(minutes=1)).strftime("%m/%d/%Y %H:%M:%S"),
+            "home_full_name": ht, "away_full_name": at, "home_name": hu, "away_name": au,
+            "home_display_result": "W", "away_display_result": "L",
+            "home_runs": 5, "away_runs": 2, "display_pitcher_info": f"N{i}",
+        }
+        hist[hu].insert(0, g)
+        hist[au].insert(0, g)
+
+def histories_from_capture(path):
+    """Historiales grabados a partir del log de capturas (capture_log.py)."""
+    from capture_log import iter_entries
+    games, hist = {}, {}
+    for e in iter_entries(path):
+        if "game" in e:
+            games[e["id"]] = e["game"]
+        if e.get("id") in games:
+            hist.setdefault(e["user"], []).append(games[e["id"]])
+    for u in hist:
+        hist[u].sort(key=lambda g: _sort_date(g), reverse=True)
+    return hist
+
+def _sort_date(g):
+    for fmt in ("%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M"):
+        try:
+            return datetime.strptime(g.get("display_date", ""), fmt)
+        except ValueError:
+            pass
+    return datetime.min
+
+
+# ===== Stub de la API =====
+class StubAPI:
+    """Servidor local de /apis/game_history.json con latencia y errores (503) configurables."""
+    def __init__(self, histories, page_size=10, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=3):
+        self.histories = histories
+        self.page_size = page_size
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                q = parse_qs(urlparse(self.path).query)
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub._rnd.random() < stub.error_rate
+                    delay = max(0.0, stub.latency + stub._rnd.uniform(-stub.jitter, stub.jitter))
+                    if fail:
+                        stub.errors += 1
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                user = (q.get("username") or [""])[0]
+                page = int((q.get("page") or ["1"])[0])
+                games = stub.histories.get(user, [])
+                body = json.dumps({
+                    "page": page,
+                    "total_pages": (len(games) + stub.page_size - 1) // stub.page_size,
+                    "game_history": games[(page - 1) * stub.page_size: page * stub.page_size],
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/apis/game_history.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ===== Medición =====
+def measure(name, fn, stub, memory=True):
+    """Corre `fn` una vez: {"name", "seconds", "requests", "errors", "peak_mb"}."""
+    req0, err0 = stub.requests, stub.errors
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    seconds = time.perf_counter() - t0
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return {
+        "name": name,
+        "seconds": round(seconds, 4),
+        "requests": stub.requests - req0,
+        "errors": stub.errors - err0,
+        "peak_mb": round(peak, 2) if peak is not None else None,
+    }
+
+def _use_league(standings, league):
+    """Reemplaza (en el mismo proceso) la liga del módulo por la del benchmark."""
+    standings.LEAGUE_ORDER[:] = league
+    standings.FETCH_ALIASES.clear()
+    standings.LEAGUE_USERS.clear()
+    standings.LEAGUE_USERS.update(u for u, _t in league)
+    standings.LEAGUE_USERS_NORM.clear()
+    standings.LEAGUE_USERS_NORM.update(u.lower() for u, _t in league)
+    standings.PLAYER_INDEX.clear()
+    standings.PLAYER_INDEX.update({u.lower(): u for u, _t in league})
+    standings.player_key.cache_clear()
+
+def _fresh_ledger(standings, path):
+    """Ledger vacío (y sin memo de agregados) para otra repetición del escenario cold."""
+    import game_ledger
+    if standings._LEDGER is not None:
+        standings._LEDGER.close()
+    game_ledger.LEDGER_FILE = path
+    standings._LEDGER = None
+    standings._RECORDS_MEMO.clear()
+
+def run(args):
+    if args.data:
+        with open(args.data, "r", encoding="utf-8") as f:
+            hist = json.load(f)
+        league = None
+    elif args.from_capture:
+        hist, league = histories_from_capture(args.from_capture), None
+    else:
+        league, hist = synthetic_histories(args.players, args.games, seed=args.seed)
+
+    stub = StubAPI(hist, page_size=args.page_size, latency_ms=args.latency_ms,
+                   jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    # Antes de importar: todo el estado del pipeline va al directorio temporal y la API al stub
+    os.environ.update({
+        "GAME_HISTORY_API": stub.url,
+        "LEDGER_FILE": os.path.join(workdir, "ledger.sqlite3"),
+        "CAPTURE_FILE": os.path.join(workdir, "captures.jsonl.gz"),
+        "LEAGUES_DIR": os.path.join(workdir, "leagues"),
+        "HISTORY_DIR": os.path.join(workdir, "history"),   # la historia es append-only: nunca la de producción
+        "GAMES_INDEX_FILE": os.path.join(workdir, "games_index.json"),
+        "METRICS_FILE": os.path.join(workdir, "updater_metrics.json"),
+        "UPSTREAM_RATE": str(args.rate),
+        "BREAKER_FAILURES": "1000000",
+    })
+    try:
+        sys.path.insert(0, BASE_DIR)
+        import standings_cascade_points_desc as standings
+        import update_cache
+
+        update_cache.CACHE_FILE = os.path.join(workdir, "standings_cache.json")
+        update_cache.SNAPSHOT_DIR = os.path.join(workdir, "snapshots")
+        if league is not None:
+            _use_league(standings, league)
+
+        results = []
+        cold_rows, cold_today = [], []
+        for i in range(args.repeat):   # cada repetición desde un ledger vacío; la última queda para warm/new
+            _fresh_ledger(standings, os.path.join(workdir, f"ledger-{i}.sqlite3"))
+            store = standings.PageStore()
+            cold_rows.append(measure("cold.compute_rows", lambda: standings.compute_rows(store=store), stub, args.memory))
+            cold_today.append(measure("cold.games_today", lambda: standings.games_played_today_scl(store=store), stub, args.memory))
+        results += [_median(cold_rows), _median(cold_today)]
+
+        warm = [measure("warm.update_data_cache", update_cache.update_data_cache, stub, args.memory)
+                for _ in range(args.repeat)]
+        results.append(_median(warm))
+
+        if league is not None and args.new_games:
+            new = []
+            for _ in range(args.repeat):   # cada repetición con su propia tanda de juegos nuevos
+                add_new_games(league, hist, args.new_games)
+                new.append(measure("new.update_data_cache", update_cache.update_data_cache, stub, args.memory))
+            results.append(_median(new))
+    finally:
+        stub.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+        "accounts": len(hist),
+        "results": results,
+    }
+
+def _median(runs):
+    out = dict(runs[0])
+    for key in ("seconds", "requests", "errors", "peak_mb"):
+        values = [r[key] for r in runs if r[key] is not None]
+        out[key] = statistics.median(values) if values else None
+    out["repeat"] = len(runs)
+    return out
+
+
+# ===== Reporte / baselines =====
+def print_report(report, baseline=None):
+    base = {r["name"]: r for r in (baseline or {}).get("results", [])}
+    print(f"\nCuentas: {report['accounts']}  config: {json.dumps(report['config'], ensure_ascii=False)}")
+    print(f"{'fase':<26} {'segundos':>9} {'requests':>9} {'errores':>8} {'pico MB':>8}")
+    regressions = []
+    for r in report["results"]:
+        line = f"{r['name']:<26} {r['seconds']:>9.3f} {r['requests']:>9} {r['errors']:>8} {r['peak_mb'] if r['peak_mb'] is not None else '-':>8}"
+        b = base.get(r["name"])
+        if b:
+            deltas = []
+            for key in ("seconds", "requests", "peak_mb"):
+                if b.get(key) and r.get(key) is not None:
+                    change = (r[key] - b[key]) / b[key]
+                    deltas.append(f"{key} {change:+.0%}")
+                    if change > REGRESSION_THRESHOLD and r[key] - b[key] > REGRESSION_MIN_DELTA[key]:
+                        regressions.append(f"{r['name']} {key}: {b[key]} -> {r[key]}")
+            line += "   vs baseline: " + ", ".join(deltas)
+        print(line)
+    return regressions
+
+def _baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark offline del pipeline de la tabla")
+    p.add_argument("--players", type=int, default=16, help="jugadores de la liga sintética")
+    p.add_argument("--games", type=int, default=60, help="juegos por jugador (aprox.)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--data", help="historiales grabados {username: [juegos]} (usa la liga de LEAGUE_ORDER)")
+    p.add_argument("--from-capture", help="historiales desde el log de capturas")
+    p.add_argument("--page-size", type=int, default=10)
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0, help="fracción de requests que responden 503")
+    p.add_argument("--rate", type=float, default=0.0, help="UPSTREAM_RATE del cliente (0 = sin límite)")
+    p.add_argument("--repeat", type=int, default=3, help="repeticiones de cada escenario (se informa la mediana)")
+    p.add_argument("--new-games", type=int, default=8, help="juegos nuevos para el escenario new")
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="sin tracemalloc (tiempos más limpios)")
+    p.add_argument("--save", help="guardar resultado como benchmarks/<nombre>.json")
+    p.add_argument("--compare", help="comparar contra benchmarks/<nombre>.json")
+    args = p.parse_args(argv)
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(_baseline_path(args.compare), "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(_baseline_path(args.save), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Baseline guardado en {_baseline_path(args.save)}")
+    if regressions:
+        print("\nRegresiones (> {:.0%} y > {seconds} s / {peak_mb} MB):".format(REGRESSION_THRESHOLD, **REGRESSION_MIN_DELTA))
+        for r in regressions:
+            print(f" - {r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# capture_log.py
+# Log de capturas append-only (JSONL comprimido con gzip) que reemplaza los dumps por usuario.
+# Cada línea es una vez que un juego apareció por primera vez en el historial de un usuario:
+#   {"id", "user", "seen_at", "game"}   ("game" = payload original, sólo la primera vez que se ve ese id)
+# Cada escritura agrega un miembro gzip al final del archivo; nunca se reescribe lo anterior.
+#
+# Lector:
+#   python capture_log.py <usuario> [raw|dedup|considered] [--team "Equipo"]
+#     raw        = todas las apariciones en el historial del usuario y sus alias
+#     dedup      = lo mismo, un juego por id
+#     considered = los que cuentan para la tabla del equipo del usuario
+import gzip, json, os, sys, threading, zlib
+from datetime import datetime, timezone
+
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", os.path.join("out", "captures.jsonl.gz"))
+
+
+def iter_entries(path=None):
+    """Recorre las líneas del log; un final truncado (corte a mitad de escritura) se ignora."""
+    path = path or CAPTURE_FILE
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+class CaptureLog:
+    """Escritor del log. Los ids ya capturados se cargan una vez (primer append) y se mantienen en memoria."""
+    def __init__(self, path=None):
+        self.path = path or CAPTURE_FILE
+        self._seen = None   # {(id, user)}
+        self._ids = None    # {id} con payload ya guardado
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._seen, self._ids = set(), set()
+        for e in iter_entries(self.path):
+            self._seen.add((e.get("id"), e.get("user")))
+            if "game" in e:
+                self._ids.add(e.get("id"))
+
+    def append(self, sightings):
+        """`sightings`: [(username, game_id, payload)]. Escribe sólo lo no visto antes; devuelve cuántas líneas."""
+        with self._lock:
+            if self._seen is None:
+                self._load()
+            seen_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            lines = []
+            for user, gid, game in sightings:
+                if (gid, user) in self._seen:
+                    continue
+                self._seen.add((gid, user))
+                entry = {"id": gid, "user": user, "seen_at": seen_at}
+                if gid not in self._ids:
+                    self._ids.add(gid)
+                    entry["game"] = game
+                lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+            if lines:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with gzip.open(self.path, "at", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            return len(lines)
+
+
+def read_user(usernames, path=None):
+    """(raw, dedup) de los usuarios dados: payloads en el orden en que se capturaron."""
+    wanted = set(usernames)
+    games, raw = {}, []
+    for e in iter_entries(path):
+        if "game" in e:
+            games[e["id"]] = e["game"]
+        if e.get("user") in wanted and e.get("id") in games:
+            raw.append(games[e["id"]])
+    dedup = list({str(g.get("id") or id(g)): g for g in raw}.values())
+    return raw, dedup
+
+
+def _main(argv):
+    import standings_cascade_points_desc as standings
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print('uso: python capture_log.py <usuario> [raw|dedup|considered] [--team "Equipo"]')
+        return 1
+    username = argv[0]
+    view = argv[1] if len(argv) > 1 and not argv[1].startswith("--") else "dedup"
+    team = dict(standings.LEAGUE_ORDER).get(username)
+    if "--team" in argv:
+        team = argv[argv.index("--team") + 1]
+
+    raw, dedup = read_user([username] + standings.FETCH_ALIASES.get(username, []), standings.CAPTURE_FILE)
+    if view == "raw":
+        out = raw
+    elif view == "considered":
+        if not team:
+            print(f"No sé qué equipo tiene {username}: usa --team")
+            return 1
+        out = []
+        for g in dedup:
+            rec = standings.GameRecord.from_api(g)
+            if (rec.mode == standings.MODE and rec.played_at and rec.played_at >= standings.SINCE_UTC
+                    and rec.league_valid and standings.norm_team(team) in (rec.home_team_key, rec.away_team_key)):
+                out.append(g)
+    else:
+        out = dedup
+    json.dump(out, sys.stdout, ensure_ascii=False, indent=2)
+    print(f"\n{len(out)} juegos ({view})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
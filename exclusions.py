@@ -0,0 +1,103 @@
+# exclusions.py
+# Juegos anulados a mano (no cuentan en la tabla, ni en juegos de hoy, ni en el calendario).
+# Reglas en data/exclusions.json:
+#   {"rules": [
+#     {"id": "123456789", "reason": "..."},
+#     {"home_team": "Yankees", "away_team": "Mets", "home_score": 0, "away_score": 0,
+#      "date": "2025-09-08", "time": "21:40", "reason": "..."}     # fecha / hora (opcional) de Chile
+#   ]}
+# Las reglas se compilan en dos índices: ids y (local, visitante, marcador, fecha) -> horas; cada juego
+# se revisa con dos búsquedas en diccionario. El archivo se vuelve a leer cuando cambia.
+# Se aplican al ingerir en el ledger (columna games.excluded); si cambian, el ledger se remarca.
+import hashlib, json, os, threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXCLUSIONS_FILE = os.getenv("EXCLUSIONS_FILE", os.path.join(BASE_DIR, "data", "exclusions.json"))
+SCL = ZoneInfo("America/Santiago")
+ANY_TIME = "*"
+
+
+def _norm(s):
+    return (s or "").strip().lower()
+
+def _local(played_at):
+    """played_at (datetime UTC o 'YYYY-MM-DD HH:MM:SS' UTC) en hora de Chile, o None."""
+    if isinstance(played_at, str):
+        try:
+            played_at = datetime.strptime(played_at, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+    if played_at is None:
+        return None
+    if played_at.tzinfo is None:
+        played_at = played_at.replace(tzinfo=timezone.utc)
+    return played_at.astimezone(SCL)
+
+
+class ExclusionRules:
+    """Reglas compiladas. `signature` identifica el contenido (cambia si cambian las reglas)."""
+    def __init__(self, rules=(), signature=""):
+        self.signature = signature
+        self.ids = set()
+        self.by_key = {}   # (local, visitante, runs local, runs visita, 'YYYY-MM-DD') -> {'HH:MM' o ANY_TIME}
+        for rule in rules:
+            if rule.get("id") not in (None, ""):
+                self.ids.add(str(rule["id"]))
+                continue
+            try:
+                key = (_norm(rule["home_team"]), _norm(rule["away_team"]),
+                       str(int(rule["home_score"])), str(int(rule["away_score"])),
+                       datetime.strptime(rule["date"], "%Y-%m-%d").strftime("%Y-%m-%d"))
+                when = datetime.strptime(rule["time"], "%H:%M").strftime("%H:%M") if rule.get("time") else ANY_TIME
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[WARN] Regla de exclusión ignorada {rule}: {e}")
+                continue
+            self.by_key.setdefault(key, set()).add(when)
+
+    def __len__(self):
+        return len(self.ids) + sum(len(v) for v in self.by_key.values())
+
+    def excluded(self, game_id, home_team, away_team, home_runs, away_runs, played_at):
+        """True si el juego calza con alguna regla (`played_at` en UTC)."""
+        if str(game_id) in self.ids:
+            return True
+        if not self.by_key:
+            return False
+        local = _local(played_at)
+        if local is None:
+            return False
+        times = self.by_key.get((_norm(home_team), _norm(away_team), str(home_runs), str(away_runs),
+                                 local.strftime("%Y-%m-%d")))
+        return bool(times) and (ANY_TIME in times or local.strftime("%H:%M") in times)
+
+
+_RULES = {"sig": None, "rules": ExclusionRules()}
+_LOCK = threading.Lock()
+
+def load_rules(path=None):
+    """Reglas vigentes; relee el archivo sólo si cambió (si no carga, se mantienen las anteriores)."""
+    path = path or EXCLUSIONS_FILE
+    try:
+        st = os.stat(path)
+        sig = (path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        sig = (path, None, None)
+    with _LOCK:
+        if sig == _RULES["sig"]:
+            return _RULES["rules"]
+        if sig[1] is None:
+            rules = ExclusionRules()
+        else:
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                data = json.loads(raw.decode("utf-8"))
+                rules = ExclusionRules(data.get("rules") or [], hashlib.sha1(raw).hexdigest())
+            except Exception as e:
+                print(f"[WARN] No se pudo leer {path} (se mantienen las reglas anteriores): {e}")
+                _RULES["sig"] = sig
+                return _RULES["rules"]
+        _RULES["sig"], _RULES["rules"] = sig, rules
+        return rules
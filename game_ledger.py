@@ -0,0 +1,298 @@
+# game_ledger.py
+# Ledger local (SQLite) de juegos de la liga.
+# - games:        una fila por id de juego (upsert), con columnas ya normalizadas para filtrar/contar
+#                 (excluded = 1: anulado por una regla de exclusions.py; no cuenta en ninguna consulta)
+# - game_sources: en qué historial(es) de usuario apareció cada juego (la tabla cuenta por historial)
+# - sync_state:   high-water mark del sync incremental por usuario (+ página desde la que sigue un
+#                 backfill cortado por MAX_PAGES)
+# - page_validators: ETag / Last-Modified / hash del cuerpo de cada (usuario, página) ya ingerida
+# - meta:         clave/valor (ej: SINCE con el que se armó la cobertura)
+import json, os, sqlite3, threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LEDGER_FILE = os.getenv("LEDGER_FILE", os.path.join(BASE_DIR, "data", "ledger.sqlite3"))
+
+# Orden de columnas de games (las tuplas que recibe ingest() van en este orden)
+GAME_COLUMNS = (
+    "id", "played_at", "game_mode",
+    "home_team", "away_team", "home_team_norm", "away_team_norm",
+    "home_user_norm", "away_user_norm", "winner_side",
+    "home_runs", "away_runs", "pitcher_info", "raw",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id             TEXT PRIMARY KEY,
+    played_at      TEXT,             -- 'YYYY-MM-DD HH:MM:SS' UTC (NULL si la fecha no se pudo leer)
+    game_mode      TEXT NOT NULL,    -- upper()
+    home_team      TEXT NOT NULL,
+    away_team      TEXT NOT NULL,
+    home_team_norm TEXT NOT NULL,    -- norm_team()
+    away_team_norm TEXT NOT NULL,
+    home_user_norm TEXT NOT NULL,    -- normalize_user_for_compare()
+    away_user_norm TEXT NOT NULL,
+    winner_side    TEXT,             -- 'H', 'A' o NULL
+    home_runs      TEXT,
+    away_runs      TEXT,
+    pitcher_info   TEXT,
+    raw            TEXT NOT NULL,    -- payload original (json)
+    excluded       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_games_home_team ON games(home_team_norm);
+CREATE INDEX IF NOT EXISTS ix_games_away_team ON games(away_team_norm);
+CREATE INDEX IF NOT EXISTS ix_games_home_user ON games(home_user_norm);
+CREATE INDEX IF NOT EXISTS ix_games_away_user ON games(away_user_norm);
+CREATE INDEX IF NOT EXISTS ix_games_mode_date ON games(game_mode, played_at);
+
+CREATE TABLE IF NOT EXISTS game_sources (
+    game_id  TEXT NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (game_id, username)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_sources_user ON game_sources(username, game_id);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    username    TEXT PRIMARY KEY,
+    newest_id   TEXT,
+    oldest_date TEXT,
+    complete    INTEGER NOT NULL DEFAULT 0,
+    next_page   INTEGER              -- cobertura incompleta: próxima página a pedir hacia atrás
+);
+
+CREATE TABLE IF NOT EXISTS page_validators (
+    username      TEXT NOT NULL,
+    page          INTEGER NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    body_hash     TEXT,
+    PRIMARY KEY (username, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _marks(n):
+    return ",".join("?" * n)
+
+
+class GameLedger:
+    """
+    Acceso al ledger. Una conexión por instancia, compartida entre hilos con un lock
+    (las escrituras son pocas: un upsert por usuario y ciclo).
+    `generation` sube cada vez que se ingieren juegos (sirve para cachear agregados en memoria).
+    """
+    def __init__(self, path=None):
+        self.path = path or LEDGER_FILE
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.generation = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            # Ledgers creados antes de la columna excluded
+            if "excluded" not in {r[1] for r in self._conn.execute("PRAGMA table_info(games)")}:
+                self._conn.execute("ALTER TABLE games ADD COLUMN excluded INTEGER NOT NULL DEFAULT 0")
+            if "next_page" not in {r[1] for r in self._conn.execute("PRAGMA table_info(sync_state)")}:
+                self._conn.execute("ALTER TABLE sync_state ADD COLUMN next_page INTEGER")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ===== meta / sync_state =====
+    def get_meta(self, key, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    def reset_sync_state(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sync_state")
+            self._conn.execute("DELETE FROM page_validators")
+
+    def get_sync_state(self, usernames):
+        rows = self._query(
+            f"SELECT * FROM sync_state WHERE username IN ({_marks(len(usernames))})", tuple(usernames)
+        )
+        return {r["username"]: dict(r) for r in rows}
+
+    def known_ids(self, username):
+        return {r[0] for r in self._query("SELECT game_id FROM game_sources WHERE username = ?", (username,))}
+
+    def existing_ids(self, ids):
+        """Los de `ids` que ya están en el ledger (por cualquier cuenta)."""
+        ids = list(ids)
+        return {r[0] for r in self._query(f"SELECT id FROM games WHERE id IN ({_marks(len(ids))})", tuple(ids))} if ids else set()
+
+    def page_validators(self, usernames):
+        """{(username, page): {"etag", "last_modified", "body_hash"}} de páginas ya ingeridas."""
+        rows = self._query(
+            f"SELECT * FROM page_validators WHERE username IN ({_marks(len(usernames))})", tuple(usernames)
+        )
+        return {(r["username"], r["page"]): {k: r[k] for k in ("etag", "last_modified", "body_hash")} for r in rows}
+
+    def last_played(self, usernames):
+        """{username: 'YYYY-MM-DD HH:MM:SS' del juego más reciente en su historial} (sin entrada si no hay)."""
+        rows = self._query(
+            "SELECT s.username, MAX(g.played_at) FROM game_sources s JOIN games g ON g.id = s.game_id"
+            f" WHERE s.username IN ({_marks(len(usernames))}) GROUP BY s.username",
+            tuple(usernames),
+        )
+        return {r[0]: r[1] for r in rows if r[1]}
+
+    # ===== Ingesta =====
+    def ingest(self, username, rows, newest_id, oldest_date, complete, validators=None, excluded=(),
+               next_page=None):
+        """
+        Upsert de juegos (tuplas en el orden de GAME_COLUMNS) vistos en el historial de `username`
+        + actualización de su sync_state (+ validadores de las páginas leídas: {page: {...}}),
+        todo en una sola transacción. `excluded`: ids de `rows` anulados por las reglas de exclusión.
+        `next_page`: con cobertura incompleta, página desde la que sigue el backfill en el próximo ciclo.
+        """
+        cols = ", ".join(GAME_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in GAME_COLUMNS[1:])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO games ({cols}) VALUES ({_marks(len(GAME_COLUMNS))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                rows,
+            )
+            self._conn.executemany(
+                "UPDATE games SET excluded = ? WHERE id = ?",
+                [(int(r[0] in excluded), r[0]) for r in rows],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO game_sources(game_id, username) VALUES (?, ?)",
+                [(r[0], username) for r in rows],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state(username, newest_id, oldest_date, complete, next_page)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (username, newest_id, oldest_date, int(bool(complete)), None if complete else next_page),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO page_validators(username, page, etag, last_modified, body_hash)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(username, p, v.get("etag"), v.get("last_modified"), v.get("body_hash"))
+                 for p, v in (validators or {}).items()],
+            )
+            if rows:
+                self.generation += 1
+
+    # ===== Exclusiones =====
+    def exclusion_candidates(self):
+        """(id, played_at, home_team, away_team, home_runs, away_runs) de todos los juegos."""
+        return self._query("SELECT id, played_at, home_team, away_team, home_runs, away_runs FROM games")
+
+    def set_excluded(self, ids):
+        """Deja anulados exactamente los juegos `ids` (al cambiar las reglas)."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE games SET excluded = 0 WHERE excluded <> 0")
+            self._conn.executemany("UPDATE games SET excluded = 1 WHERE id = ?", [(i,) for i in ids])
+            self.generation += 1
+
+    # ===== Consultas =====
+    def user_games(self, usernames, since=None):
+        """Payloads originales de los historiales de `usernames` (sin repetir id), del más nuevo al más antiguo."""
+        sql = (
+            f"SELECT raw FROM games WHERE id IN (SELECT game_id FROM game_sources WHERE username IN ({_marks(len(usernames))}))"
+        )
+        params = list(usernames)
+        if since is not None:
+            sql += " AND played_at >= ?"
+            params.append(since)
+        sql += " ORDER BY played_at DESC, id DESC"
+        return [json.loads(r["raw"]) for r in self._query(sql, params)]
+
+    def _league_where(self, usernames, members):
+        """WHERE común: historial de `usernames` + no anulado + modo + fecha + filtro (ambos miembros) o (CPU + miembro)."""
+        um, mm = _marks(len(usernames)), _marks(len(members))
+        sql = (
+            f"g.id IN (SELECT game_id FROM game_sources WHERE username IN ({um}))"
+            " AND g.excluded = 0 AND g.game_mode = ? AND g.played_at >= ?"
+            f" AND ((g.home_user_norm IN ({mm}) AND g.away_user_norm IN ({mm}))"
+            f"   OR (g.home_user_norm = 'cpu' AND g.away_user_norm IN ({mm}))"
+            f"   OR (g.away_user_norm = 'cpu' AND g.home_user_norm IN ({mm})))"
+        )
+        return sql, list(usernames), list(members)
+
+    def team_record(self, team_norm, usernames, members, mode, since):
+        """(wins, losses) de `team_norm` contando solo juegos del historial de `usernames`."""
+        where, up, mp = self._league_where(usernames, members)
+        won = "((g.winner_side = 'H' AND g.home_team_norm = ?) OR (g.winner_side = 'A' AND g.away_team_norm = ?))"
+        lost = "((g.winner_side = 'H' AND g.away_team_norm = ?) OR (g.winner_side = 'A' AND g.home_team_norm = ?))"
+        sql = (
+            f"SELECT COALESCE(SUM(CASE WHEN {won} THEN 1 ELSE 0 END), 0) AS wins,"
+            f" COALESCE(SUM(CASE WHEN NOT {won} AND {lost} THEN 1 ELSE 0 END), 0) AS losses"
+            f" FROM games g WHERE {where}"
+        )
+        row = self._query(sql, [team_norm] * 6 + up + [mode, since] + mp * 4)[0]
+        return row["wins"], row["losses"]
+
+    def league_games(self, usernames, members, mode, since):
+        """
+        Todos los juegos válidos de la liga, una fila por id (ya deduplicados entre historiales):
+        (id, home_team_norm, away_team_norm, winner_side, [usernames en cuyo historial aparece]).
+        """
+        where, up, mp = self._league_where(usernames, members)
+        um = _marks(len(usernames))
+        sql = (
+            "SELECT g.id, g.home_team_norm, g.away_team_norm, g.winner_side,"
+            f" (SELECT GROUP_CONCAT(s.username, char(31)) FROM game_sources s"
+            f"   WHERE s.game_id = g.id AND s.username IN ({um})) AS sources"
+            f" FROM games g WHERE {where}"
+        )
+        rows = self._query(sql, up + up + [mode, since] + mp * 4)
+        return [(r[0], r[1], r[2], r[3], (r[4] or "").split("\x1f")) for r in rows]
+
+    def league_game_log(self, usernames, members, mode, since):
+        """
+        Como league_games pero con fecha y marcador (para los índices por equipo / enfrentamiento),
+        del más nuevo al más antiguo.
+        """
+        where, up, mp = self._league_where(usernames, members)
+        um = _marks(len(usernames))
+        sql = (
+            "SELECT g.id, g.played_at, g.home_team, g.away_team, g.home_team_norm, g.away_team_norm,"
+            " g.winner_side, g.home_runs, g.away_runs,"
+            f" (SELECT GROUP_CONCAT(s.username, char(31)) FROM game_sources s"
+            f"   WHERE s.game_id = g.id AND s.username IN ({um})) AS sources"
+            f" FROM games g WHERE {where}"
+            " ORDER BY g.played_at DESC, g.id DESC"
+        )
+        rows = self._query(sql, up + up + [mode, since] + mp * 4)
+        return [dict(r, sources=(r["sources"] or "").split("\x1f")) for r in rows]
+
+    def team_games(self, team_norm, usernames, members, mode, since):
+        """Juegos considerados para `team_norm` (payload original), del más nuevo al más antiguo."""
+        where, up, mp = self._league_where(usernames, members)
+        sql = (
+            f"SELECT g.raw FROM games g WHERE {where}"
+            " AND ? IN (g.home_team_norm, g.away_team_norm)"
+            " ORDER BY g.played_at DESC, g.id DESC"
+        )
+        rows = self._query(sql, up + [mode, since] + mp * 4 + [team_norm])
+        return [json.loads(r["raw"]) for r in rows]
+
+    def games_between(self, usernames, mode, start, end):
+        """Filas (todas las columnas menos `raw`) de juegos no anulados de `mode` jugados en [start, end) UTC."""
+        cols = ", ".join(GAME_COLUMNS[:-1])
+        sql = (
+            f"SELECT {cols} FROM games WHERE id IN (SELECT game_id FROM game_sources WHERE username IN ({_marks(len(usernames))}))"
+            " AND excluded = 0 AND game_mode = ? AND played_at >= ? AND played_at < ?"
+            " ORDER BY played_at DESC, id DESC"
+        )
+        return self._query(sql, list(usernames) + [mode, start, end])
@@ -0,0 +1,160 @@
+# leagues.py
+# Ligas definidas en archivos de datos, servidas por la misma web y el mismo updater.
+# Cada liga es data/leagues/<slug>.json:
+#   {
+#     "name": "Temporada 2",
+#     "since": "2026-01-10",                      # inicio de la temporada (UTC, "YYYY-MM-DD[ HH:MM:SS]")
+#     "mode": "LEAGUE",                           # game_mode que cuenta
+#     "teams": [["usuario", "Equipo"], ...],      # username EXACTO -> equipo (orden de la tabla)
+#     "aliases": {"usuario": ["cuenta_alterna"]}, # opcional
+#     "extra_members": ["cuenta_historica"],      # opcional: cuentas miembro sin equipo
+#     "record_adjustments": {"Equipo": [w, l]},   # opcional
+#     "point_adjustments": {"Equipo": [pts, "razón"]},  # opcional
+#     "scheduled": 45,                            # opcional
+#     "semanas_file": "data/leagues/<slug>/semanas.json",          # opcional
+#     "overrides_file": "data/leagues/<slug>/manual_overrides.json"  # opcional
+#   }
+# El estado publicado de cada liga (cache + snapshots + índice de juegos + historia) va en data/leagues/<slug>/.
+# La liga DEFAULT_LEAGUE es la de las constantes de standings_cascade_points_desc.py; se sigue
+# publicando en standings_cache.json y sirviendo en /api/full.
+import json, os, re
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LEAGUES_DIR = os.getenv("LEAGUES_DIR", os.path.join(BASE_DIR, "data", "leagues"))
+DEFAULT_LEAGUE = os.getenv("DEFAULT_LEAGUE", "default")
+SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+class League:
+    """Configuración de una liga. `members_norm` / `player_index` se derivan igual que en standings."""
+    def __init__(self, slug, order, since, mode="LEAGUE", aliases=None, extra_members=(),
+                 record_adjustments=None, point_adjustments=None, scheduled=45, name=None,
+                 cache_file=None, snapshot_dir=None, semanas_file=None, overrides_file=None):
+        self.slug = slug
+        self.name = name or slug
+        self.order = [tuple(t) for t in order]
+        self.since = since
+        self.mode = mode
+        self.aliases = {k: list(v) for k, v in (aliases or {}).items()}
+        self.record_adjustments = {k: tuple(v) for k, v in (record_adjustments or {}).items()}
+        self.point_adjustments = {k: tuple(v) for k, v in (point_adjustments or {}).items()}
+        self.scheduled = scheduled
+        state_dir = os.path.join(LEAGUES_DIR, slug)
+        self.cache_file = cache_file or os.path.join(state_dir, "standings_cache.json")
+        self.snapshot_dir = snapshot_dir or os.path.join(state_dir, "snapshots")
+        self.games_index_file = os.path.join(state_dir, "games_index.json")
+        self.history_dir = os.path.join(state_dir, "history")
+        self.shared_payload_file = os.path.join(state_dir, "full_payload.bin")
+        self.semanas_file = semanas_file
+        self.overrides_file = overrides_file
+
+        users = {u for u, _t in self.order} | set(extra_members)
+        for base, alts in self.aliases.items():
+            users.add(base)
+            users.update(alts)
+        self.members_norm = {u.lower() for u in users}
+        # nombre normalizado -> principal (los alias apuntan a su principal)
+        self.player_index = {u.lower(): u for u, _t in self.order}
+        for base, alts in self.aliases.items():
+            for alt in alts:
+                self.player_index[alt.lower()] = base
+        for u in users:
+            self.player_index.setdefault(u.lower(), u)
+
+    @property
+    def since_key(self):
+        return self.since.strftime("%Y-%m-%d %H:%M:%S")
+
+    def usernames(self, order=None):
+        """Cuentas a sincronizar: principal + alias de cada participante."""
+        names = []
+        for user_exact, _team in (self.order if order is None else order):
+            names += [user_exact] + self.aliases.get(user_exact, [])
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def from_file(cls, path):
+        slug = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+
+        def rel(p):
+            return p if not p or os.path.isabs(p) else os.path.join(BASE_DIR, p)
+
+        return cls(
+            slug, cfg["teams"], _parse_since(cfg["since"]),
+            mode=(cfg.get("mode") or "LEAGUE").upper(),
+            aliases=cfg.get("aliases"),
+            extra_members=cfg.get("extra_members") or (),
+            record_adjustments=cfg.get("record_adjustments"),
+            point_adjustments=cfg.get("point_adjustments"),
+            scheduled=int(cfg.get("scheduled", 45)),
+            name=cfg.get("name"),
+            semanas_file=rel(cfg.get("semanas_file")) or os.path.join(LEAGUES_DIR, slug, "semanas.json"),
+            overrides_file=rel(cfg.get("overrides_file")) or os.path.join(LEAGUES_DIR, slug, "manual_overrides.json"),
+        )
+
+
+def apply_fixture_results(semanas, fixture_results):
+    """
+    Aplica (en `semanas`) los resultados conciliados por el updater:
+    fixture_results = {semana: {posición: {local, visitante, resultado, estado}}}.
+    Sólo si el fixture sigue "Pendiente" y la posición sigue siendo el mismo cruce.
+    """
+    for semana, por_pos in (fixture_results or {}).items():
+        juegos = semanas.get("semanas", {}).get(semana, [])
+        for pos, res in por_pos.items():
+            i = int(pos)
+            if i >= len(juegos):
+                continue
+            juego = juegos[i]
+            if (
+                juego.get("estado") == "Pendiente"
+                and juego.get("local") == res.get("local")
+                and juego.get("visitante") == res.get("visitante")
+            ):
+                juego["estado"] = res["estado"]
+                juego["resultado"] = res["resultado"]
+    return semanas
+
+def apply_overrides(semanas, overrides):
+    """Aplica (en `semanas`) manual_overrides.json sobre los cruces de la semana actual; va DESPUÉS de los conciliados."""
+    semana_actual = str(semanas.get("semana_actual"))
+    for _key, val in (overrides or {}).items():
+        for juego in (semanas.get("semanas") or {}).get(semana_actual, []):
+            if (
+                juego.get("local") == val.get("local")
+                and juego.get("visitante") == val.get("visitante")
+            ):
+                if "resultado" in val:
+                    juego["resultado"] = val["resultado"]
+                if "estado" in val:
+                    juego["estado"] = val["estado"]
+    return semanas
+
+def _parse_since(s):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"since inválido: {s!r}")
+
+def load_league_files(directory=None):
+    """{slug: League} de los archivos *.json de LEAGUES_DIR (los que no cargan se informan y se saltan)."""
+    directory = directory or LEAGUES_DIR
+    out = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return out
+    for name in names:
+        slug, ext = os.path.splitext(name)
+        if ext != ".json" or not SLUG_RE.match(slug) or slug == DEFAULT_LEAGUE:
+            continue
+        try:
+            out[slug] = League.from_file(os.path.join(directory, name))
+        except Exception as e:
+            print(f"[WARN] Liga {name} ignorada: {e}")
+    return out
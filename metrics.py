@@ -0,0 +1,76 @@
+# metrics.py
+# Métricas mínimas en formato texto de Prometheus (sin dependencias).
+# - Histogram: buckets fijos, thread-safe; snapshot() es un dict JSON (así el updater lo comparte
+#   por el cache y la web lo vuelve a exponer).
+# - render(): arma el texto de /metrics a partir de familias (nombre, tipo, ayuda, muestras).
+import threading
+
+# Segundos: desde respuestas locales (ms) hasta timeouts de la API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+def _value(v):
+    if v is None:
+        return "NaN"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def histogram_samples(name, snapshot, labels=None):
+    """Muestras _bucket/_sum/_count (acumuladas) de un snapshot de Histogram."""
+    labels = dict(labels or {})
+    out, acc = [], 0
+    for le, n in zip(list(snapshot["buckets"]) + ["+Inf"], snapshot["counts"]):
+        acc += n
+        out.append((f"{name}_bucket", dict(labels, le=le if le == "+Inf" else repr(float(le))), acc))
+    out.append((f"{name}_sum", labels, snapshot["sum"]))
+    out.append((f"{name}_count", labels, snapshot["count"]))
+    return out
+
+def render(families):
+    """
+    `families`: [(nombre, tipo, ayuda, muestras)], muestras = [(labels, valor)] o, para
+    histogramas, [(labels, snapshot)]. Devuelve el texto de exposición.
+    """
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind == "histogram":
+                for sample_name, sample_labels, v in histogram_samples(name, value, labels):
+                    lines.append(f"{sample_name}{_labels(sample_labels)} {_value(v)}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,125 @@
+# profiling.py
+# Perfiles opcionales (por variable de entorno) del ciclo de actualización y de la API.
+#   PROFILE=cprofile  -> cProfile por llamada; se guarda <ts>-<nombre>-<pid>.prof (pstats: snakeviz, flameprof)
+#   PROFILE=sample    -> muestreo de la pila cada PROFILE_INTERVAL_MS; se guarda .folded
+#                        (formato "pila;colapsada N": flamegraph.pl, speedscope, inferno)
+#   PROFILE_EVERY=N       perfila 1 de cada N llamadas de cada función (por proceso)
+#   PROFILE_TARGETS=a,b   sólo esas funciones (por defecto todas las marcadas con @profiled)
+#   PROFILE_DIR / PROFILE_KEEP: carpeta de salida y cuántos archivos se conservan (los más viejos se borran)
+# Sin PROFILE, @profiled devuelve la función tal cual: costo cero.
+import cProfile, functools, os, sys, threading, time
+from collections import Counter
+from datetime import datetime
+
+PROFILE = os.getenv("PROFILE", "").strip().lower()            # "", "cprofile" o "sample"
+PROFILE_EVERY = max(int(os.getenv("PROFILE_EVERY", "1")), 1)
+PROFILE_TARGETS = {t.strip() for t in os.getenv("PROFILE_TARGETS", "").split(",") if t.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("out", "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+_COUNTS = Counter()
+_LOCK = threading.Lock()
+_ACTIVE = threading.local()   # un perfil a la vez por hilo: las llamadas anidadas quedan dentro del de afuera
+# Un perfil a la vez por proceso: desde Python 3.12 un segundo cProfile activo lanza ValueError
+# ("Another profiling tool is already active"); la llamada que no lo obtiene corre sin perfil
+_RUNNING = threading.Lock()
+
+
+def _enabled(name):
+    return PROFILE in ("cprofile", "sample") and (not PROFILE_TARGETS or name in PROFILE_TARGETS)
+
+def _output_path(name, ext):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S-%f")[:-3]
+    return os.path.join(PROFILE_DIR, f"{ts}-{name}-{os.getpid()}.{ext}")
+
+def _rotate():
+    """Deja sólo los PROFILE_KEEP archivos más nuevos."""
+    try:
+        names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith((".prof", ".folded")))
+    except OSError:
+        return
+    for name in names[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+class _Sampler(threading.Thread):
+    """Muestrea la pila de un hilo y la acumula en formato colapsado."""
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != __file__:   # sin los marcos del propio perfilador
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def _run_profiled(name, func, args, kwargs):
+    _ACTIVE.on = True
+    t0 = time.perf_counter()
+    try:
+        if PROFILE == "cprofile":
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(func, *args, **kwargs)
+            finally:
+                path = _output_path(name, "prof")
+                prof.dump_stats(path)
+        sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0)
+        sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.stop()
+            path = _output_path(name, "folded")
+            sampler.write(path)
+    finally:
+        _ACTIVE.on = False
+        _rotate()
+        print(f"[profile] {name}: {time.perf_counter() - t0:.3f} s -> {path}")
+
+def profiled(name):
+    """Decorador: perfila 1 de cada PROFILE_EVERY llamadas a la función (si PROFILE está activo)."""
+    def decorate(func):
+        if not _enabled(name):
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_ACTIVE, "on", False):
+                return func(*args, **kwargs)
+            with _LOCK:
+                _COUNTS[name] += 1
+                sample = _COUNTS[name] % PROFILE_EVERY == 0
+            if not sample or not _RUNNING.acquire(blocking=False):
+                return func(*args, **kwargs)
+            try:
+                return _run_profiled(name, func, args, kwargs)
+            finally:
+                _RUNNING.release()
+        return wrapper
+    return decorate
@@ -0,0 +1,145 @@
+# projections.py
+# Proyección de fin de temporada por Monte Carlo (NumPy, vectorizado por lotes).
+# - Fuerza de cada equipo: % de victorias encogido hacia .500 con SIM_PRIOR_GAMES juegos ficticios
+#   (mitad ganados): (W + k/2) / (W + L + k). Con pocos juegos jugados todos quedan cerca de .500;
+#   un cruce local vs visitante se resuelve con log5 entre ambas fuerzas.
+# - Se juegan los fixtures del calendario que siguen abiertos (Pendiente / SIMULADO sin resultado
+#   conciliado); el resto de los juegos por jugar de cada equipo va contra un rival promedio.
+# - Orden final igual que la tabla: puntos, victorias, menos derrotas; empates al azar.
+# Devuelve la distribución de puesto final, % de playoffs y números mágicos / de eliminación.
+import hashlib, json, os
+from collections import OrderedDict
+
+import numpy as np
+
+SIM_RUNS = int(os.getenv("SIM_RUNS", "100000"))
+SIM_BATCH = int(os.getenv("SIM_BATCH", "25000"))        # temporadas por lote (acota la memoria)
+PLAYOFF_SPOTS = int(os.getenv("PLAYOFF_SPOTS", "8"))
+SIM_PRIOR_GAMES = float(os.getenv("SIM_PRIOR_GAMES", "30"))   # juegos ficticios a .500 por equipo
+
+# Última proyección por entradas (semilla): el updater la recalcula sólo si cambió la tabla o el calendario
+_MEMO = OrderedDict()
+_MEMO_SIZE = 8
+
+
+def _norm(s):
+    return (s or "").strip().lower()
+
+def open_fixtures(semanas, fixture_results=None):
+    """[(local, visitante)] del calendario que todavía no tienen resultado."""
+    fixture_results = fixture_results or {}
+    out = []
+    for semana, juegos in ((semanas or {}).get("semanas") or {}).items():
+        resolved = fixture_results.get(str(semana)) or {}
+        for pos, juego in enumerate(juegos or []):
+            if (juego.get("estado") or "").strip().upper() == "JUGADO" or str(pos) in resolved:
+                continue
+            out.append((juego.get("local"), juego.get("visitante")))
+    return out
+
+def _kth_smallest(values, k):
+    """k-ésimo menor (1-based) por fila, sin contar la diagonal; None si no hay suficientes."""
+    if k <= 0 or k > values.shape[1] - 1:
+        return [None] * values.shape[0]
+    masked = values.astype(float)
+    np.fill_diagonal(masked, np.inf)
+    return [int(v) for v in np.sort(masked, axis=1)[:, k - 1]]
+
+def clinch_numbers(wins, remaining, spots):
+    """
+    (mágico, eliminación) por equipo para entrar entre los `spots` primeros, en victorias
+    (no considera ajustes de puntos ni desempates).
+    mágico     = victorias propias + derrotas rivales para que T-spots equipos ya no lo alcancen.
+    eliminación = victorias rivales + derrotas propias para que `spots` equipos queden fuera de su alcance.
+    """
+    wins = np.asarray(wins)
+    max_wins = wins + np.asarray(remaining)
+    t = len(wins)
+    # vs[i, j]: juegos que faltan para que j ya no alcance a i / para que i ya no alcance a j
+    magic = _kth_smallest(max_wins[None, :] - wins[:, None] + 1, t - spots)
+    elim = _kth_smallest(max_wins[:, None] - wins[None, :] + 1, spots)
+    magic = [0 if m is None else max(m, 0) for m in magic]
+    elim = [None if e is None else max(e, 0) for e in elim]
+    return magic, elim
+
+def _seed(rows, fixtures, runs, spots):
+    """Semilla derivada de las entradas: misma tabla + calendario => misma proyección (y mismo hash del cache)."""
+    raw = json.dumps([[(r.get("team"), r.get("wins"), r.get("losses"), r.get("remaining"), r.get("points"))
+                       for r in rows], fixtures, runs, spots, SIM_PRIOR_GAMES], ensure_ascii=False)
+    return int(hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], 16)
+
+def simulate(rows, semanas=None, fixture_results=None, runs=None, spots=None):
+    """
+    Proyección a partir de las filas de compute_rows() y el calendario.
+    Devuelve {"runs", "playoff_spots", "teams": [{team, playoff_odds, rank_dist, avg_wins,
+    magic_number, elimination_number, clinched, eliminated}]} en el orden de `rows`.
+    """
+    runs = SIM_RUNS if runs is None else runs
+    spots = min(PLAYOFF_SPOTS if spots is None else spots, len(rows))
+    t = len(rows)
+    if not t:
+        return {"runs": 0, "playoff_spots": spots, "teams": []}
+    index = {_norm(r.get("team")): i for i, r in enumerate(rows)}
+    wins = np.array([r.get("wins", 0) for r in rows], dtype=np.int64)
+    losses = np.array([r.get("losses", 0) for r in rows], dtype=np.int64)
+    remaining = np.array([r.get("remaining", 0) for r in rows], dtype=np.int64)
+    points = np.array([r.get("points", 0) for r in rows], dtype=np.float64)
+
+    # Fixtures abiertos entre equipos de la tabla -> matrices de incidencia (fixture x equipo)
+    pairs = [(index[_norm(h)], index[_norm(a)]) for h, a in open_fixtures(semanas, fixture_results)
+             if _norm(h) in index and _norm(a) in index]
+    fixtures = [[rows[h]["team"], rows[a]["team"]] for h, a in pairs]
+    home = np.zeros((len(pairs), t), dtype=np.float32)
+    away = np.zeros((len(pairs), t), dtype=np.float32)
+    for f, (h, a) in enumerate(pairs):
+        home[f, h] = 1
+        away[f, a] = 1
+    scheduled_left = (home.sum(axis=0) + away.sum(axis=0)).astype(np.int64)
+    extra = np.maximum(remaining - scheduled_left, 0)   # juegos sin rival definido en el calendario
+    games_left = scheduled_left + extra
+
+    strength = (wins + SIM_PRIOR_GAMES / 2) / (wins + losses + SIM_PRIOR_GAMES)
+    hp, ap = strength[[h for h, _ in pairs]], strength[[a for _, a in pairs]]
+    p_home = (hp * (1 - ap) / np.maximum(hp * (1 - ap) + ap * (1 - hp), 1e-12)).astype(np.float32)
+
+    seed = _seed(rows, fixtures, runs, spots)
+    if seed in _MEMO:
+        return _MEMO[seed]
+    rng = np.random.default_rng(seed)
+    rank_counts = np.zeros((t, t), dtype=np.int64)
+    win_sum = np.zeros(t, dtype=np.float64)
+    done = 0
+    while done < runs:
+        n = min(SIM_BATCH, runs - done)
+        home_won = (rng.random((n, len(pairs)), dtype=np.float32) < p_home).astype(np.float32)
+        final_wins = wins + (home_won @ home + (1 - home_won) @ away).astype(np.int64) \
+            + rng.binomial(extra, strength, size=(n, t))
+        final_losses = losses + games_left - (final_wins - wins)
+        # Clave de orden de la tabla; la parte fraccionaria desempata al azar
+        key = (points * 100 + final_wins) * 100 + (99 - final_losses) + rng.random((n, t))
+        ranks = np.argsort(np.argsort(-key, axis=1), axis=1)
+        for i in range(t):
+            rank_counts[i] += np.bincount(ranks[:, i], minlength=t)
+        win_sum += final_wins.sum(axis=0)
+        done += n
+
+    magic, elim = clinch_numbers(wins, remaining, spots)
+    teams = []
+    for i, r in enumerate(rows):
+        dist = rank_counts[i] / runs
+        odds = float(dist[:spots].sum())
+        teams.append({
+            "team": r.get("team"),
+            "playoff_odds": round(odds, 4),
+            "rank_dist": [round(float(p), 4) for p in dist],
+            "avg_wins": round(float(win_sum[i] / runs), 2),
+            "magic_number": magic[i],
+            "elimination_number": elim[i],
+            "clinched": magic[i] == 0,
+            "eliminated": elim[i] == 0,
+        })
+    result = {"runs": runs, "playoff_spots": spots, "teams": teams}
+    _MEMO[seed] = result
+    while len(_MEMO) > _MEMO_SIZE:
+        _MEMO.popitem(last=False)
+    return result
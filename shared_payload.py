@@ -0,0 +1,95 @@
+# shared_payload.py
+# Respuesta de /api/full lista para servir, compartida entre los workers de gunicorn por un archivo.
+# Un solo proceso (el líder, ver app.py) arma la respuesta (JSON + gzip + br) y la escribe; los demás
+# la leen de una vez (una lectura por versión) sin volver a parsear, serializar ni comprimir.
+# Cada worker guarda su propia copia en memoria: lo que se comparte es el trabajo, no la RAM.
+# Formato:  MAGIC | <I largo del header> | header JSON | blobs
+#   header = {"key", "league", "version", "last_modified", "blobs": {nombre: [offset, largo]}}
+# Cada versión se escribe en un archivo nuevo y se renombra encima (un lector ve la versión vieja
+# completa o la nueva completa, nunca una mezcla).
+import json, os, struct, tempfile
+
+MAGIC = b"SCFP1\n"
+_LEN = struct.Struct("<I")
+
+
+def jsonable_key(key):
+    """La clave de entradas (tuplas de firmas de archivos) tal como queda guardada en el header."""
+    return json.loads(json.dumps(key))
+
+def write_entry(path, entry):
+    """Escribe la entrada de /api/full (`body` + `encoded`) en `path` de forma atómica."""
+    blobs = [("body", entry["body"])] + sorted(entry["encoded"].items())
+    header, offset = {}, 0
+    for name, data in blobs:
+        header[name] = [offset, len(data)]
+        offset += len(data)
+    meta = json.dumps({
+        "key": entry["key"],
+        "league": entry.get("league"),
+        "version": entry["version"],
+        "last_modified": entry["last_modified"],
+        "blobs": header,
+    }).encode("utf-8")
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".bin", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + _LEN.pack(len(meta)) + meta)
+            for _name, data in blobs:
+                f.write(data)
+        os.chmod(tmp, 0o644)  # mkstemp crea con 0600
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def read_entry(path):
+    """Entrada de /api/full desde `path` (sin `payload`: se parsea sólo si hace falta un delta), o None."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    try:
+        if raw[:len(MAGIC)] != MAGIC:
+            return None
+        start = len(MAGIC) + _LEN.size
+        (meta_len,) = _LEN.unpack_from(raw, len(MAGIC))
+        meta = json.loads(raw[start:start + meta_len])
+        base = start + meta_len
+        blobs = {name: raw[base + off:base + off + n] for name, (off, n) in meta["blobs"].items()}
+        if any(len(b) != n for b, (_off, n) in zip(blobs.values(), meta["blobs"].values())):
+            return None   # archivo truncado
+    except (ValueError, KeyError, struct.error):
+        return None
+    return {
+        "key": meta["key"],
+        "league": meta.get("league"),
+        "version": meta["version"],
+        "body": blobs.pop("body"),
+        "encoded": blobs,
+        "last_modified": meta["last_modified"],
+    }
+
+
+class SharedPayload:
+    """Lector de un archivo compartido; se vuelve a leer sólo cuando el archivo cambia."""
+    def __init__(self, path):
+        self.path = path
+        self._sig = None
+        self._entry = None
+
+    def entry(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if sig != self._sig:
+            self._entry, self._sig = read_entry(self.path), sig
+        return self._entry
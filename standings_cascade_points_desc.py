@@ -1,11 +1,20 @@
 2# standings_cascade_points.py
-# Tabla de posiciones (2 páginas por jugador) con columnas:
+# Tabla de posiciones (historial incremental por jugador) con columnas:
 # Pos | Equipo | Jugador | Prog(13) | JJ | W | L | Por jugar | Pts
 # Reglas: LEAGUE + fecha, filtro (ambos miembros) o (CPU + miembro), dedup por id, ajustes algebraicos.
 # Orden: por puntos (desc). Empates: por W (desc), luego L (asc).
 
-import requests, time, re, os, json
-from datetime import datetime
+import requests, time, re, os, json, threading, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
+from game_ledger import GameLedger
+import exclusions
+from upstream_client import UpstreamClient, UpstreamError
+from capture_log import CaptureLog
+from leagues import League, DEFAULT_LEAGUE, load_league_files
+from profiling import profiled
 # ===== Config general =====
 
 # ===== MODO DE EJECUCIÓN (switch) =====
@@ -18,6 +27,7 @@ CFG = {
         PRINT_CAPTURE_SUMMARY=True,   # imprime resumen por equipo
         PRINT_CAPTURE_LIST=False,     # NO lista juego por juego
         DUMP_ENABLED=True,            # genera JSON en carpeta out/
+        CAPTURE_ENABLED=True,         # log de capturas out/captures.jsonl.gz
         STOP_AFTER_N=None,            # procesa todos
         DAY_WINDOW_MODE="calendar",   # "hoy" = día calendario Chile (00:00–23:59)
     ),
@@ -26,6 +36,8 @@ CFG = {
         PRINT_CAPTURE_SUMMARY=False,  # sin resúmenes
         PRINT_CAPTURE_LIST=False,     # sin listado
         DUMP_ENABLED=False,           # sin JSONs
+        CAPTURE_ENABLED=False,        # sin log de capturas: crece sin tope y se relee entero al reiniciar
+                                      # (activar a mano con CAPTURE_ENABLED=1 para diagnosticar)
         STOP_AFTER_N=None,            # todos
         DAY_WINDOW_MODE="sports",     # "hoy" = 06:00–05:59 (día deportivo Chile)
     ),
@@ -65,13 +77,29 @@ else:
 
 DAY_WINDOW_MODE = conf["DAY_WINDOW_MODE"]  # "calendar" o "sports"
 
-API = "https://mlb25.theshow.com/apis/game_history.json"
+API = os.getenv("GAME_HISTORY_API", "https://mlb25.theshow.com/apis/game_history.json")  # benchmark.py apunta a un stub local
 PLATFORM = "psn"
 MODE = "LEAGUE"
 SINCE = datetime(2025, 9, 28)
-PAGES = (1, 2, 3)   # <-- SOLO p1 y p2, como validaste
+# Sync incremental: se pide p1, p2, ... hasta llegar a juegos ya conocidos o anteriores a SINCE
+MAX_PAGES = int(os.getenv("MAX_PAGES", "25"))   # tope de seguridad por usuario y ciclo
 TIMEOUT = 20
-RETRIES = 2
+CONNECT_TIMEOUT = 5
+RETRIES = int(os.getenv("RETRIES", "3"))   # intentos por página (con backoff exponencial + jitter)
+
+# Cliente de la API (ver upstream_client.py)
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "5"))     # requests/segundo, global (0 = sin límite)
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "10"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))             # fallos seguidos que abren el circuito
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))  # tiempo abierto antes de probar
+
+# Agregación de la tabla:
+#   "league" = una sola pasada por los juegos únicos de toda la liga (ganador y perdedor a la vez)
+#   "team"   = una consulta por equipo sobre su propio historial
+AGGREGATION = os.getenv("AGGREGATION", "league")
+
+# Descargas concurrentes: máximo de requests simultáneos contra la API (1 = secuencial)
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
 
 # Mostrar detalle por equipo (línea a línea). Deja False para tabla limpia.
 PRINT_DETAILS = False
@@ -80,8 +108,11 @@ PRINT_DETAILS = False
 STOP_AFTER_N = None
 
 # === Capturas / dumps ===
-DUMP_ENABLED = True
+DUMP_ENABLED = True            # standings.json / games_today.json de main()
 DUMP_DIR = "out"
+# Log append-only de juegos capturados (ver capture_log.py; reemplaza los dumps por usuario)
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "1" if conf["CAPTURE_ENABLED"] else "0") == "1"
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", os.path.join(DUMP_DIR, "captures.jsonl.gz"))
 PRINT_CAPTURE_SUMMARY = True   # imprime resumen capturas por equipo
 PRINT_CAPTURE_LIST = False     # lista cada juego capturado (puede ser muy verboso)
 
@@ -147,6 +178,16 @@ for base, alts in FETCH_ALIASES.items():
 LEAGUE_USERS.update({"AiramReynoso_", "Yosoyreynoso_"})
 LEAGUE_USERS_NORM = {u.lower() for u in LEAGUE_USERS}
 
+# ===== Índice de identidad de jugadores =====
+# nombre normalizado -> username principal de LEAGUE_ORDER (los alias apuntan a su principal;
+# los extras de LEAGUE_USERS sin principal apuntan a sí mismos). Sus claves == LEAGUE_USERS_NORM.
+PLAYER_INDEX = {u.lower(): u for (u, _t) in LEAGUE_ORDER}
+for base, alts in FETCH_ALIASES.items():
+    for alt in alts:
+        PLAYER_INDEX[alt.lower()] = base
+for u in LEAGUE_USERS:
+    PLAYER_INDEX.setdefault(u.lower(), u)
+
 # ===== Utilidades =====
 BXX_RE = re.compile(r"\^(b\d+)\^", flags=re.IGNORECASE)
 
@@ -177,19 +218,463 @@ def parse_date(s: str):
             pass
     return None
 
-def fetch_page(username: str, page: int):
+@lru_cache(maxsize=4096)
+def player_key(raw: str) -> str:
+    """normalize_user_for_compare memoizado (los mismos ~20 nombres se repiten en cada juego)."""
+    return normalize_user_for_compare(raw)
+
+# ===== Representación compacta de un juego =====
+class GameRecord:
+    """
+    Juego ya parseado una sola vez al ingerir el payload de la API.
+    played_at = datetime UTC (aware) o None; *_team_key = norm_team(); *_player = player_key();
+    *_owner = principal según PLAYER_INDEX (None si no es miembro); winner = "H", "A" o None.
+    """
+    __slots__ = (
+        "id", "played_at", "mode",
+        "home_team", "away_team", "home_team_key", "away_team_key",
+        "home_player", "away_player", "home_owner", "away_owner",
+        "winner", "home_runs", "away_runs", "pitcher_info", "raw",
+    )
+
+    def __init__(self, id, played_at, mode, home_team, away_team, home_player, away_player,
+                 winner, home_runs, away_runs, pitcher_info, raw=None):
+        self.id = id
+        self.played_at = played_at
+        self.mode = mode
+        self.home_team = home_team
+        self.away_team = away_team
+        self.home_team_key = norm_team(home_team)
+        self.away_team_key = norm_team(away_team)
+        self.home_player = home_player
+        self.away_player = away_player
+        self.home_owner = PLAYER_INDEX.get(home_player)
+        self.away_owner = PLAYER_INDEX.get(away_player)
+        self.winner = winner
+        self.home_runs = home_runs
+        self.away_runs = away_runs
+        self.pitcher_info = pitcher_info
+        self.raw = raw
+
+    @classmethod
+    def from_api(cls, g):
+        d = parse_date(g.get("display_date", ""))
+        hr = (g.get("home_display_result") or "").strip().upper()
+        ar = (g.get("away_display_result") or "").strip().upper()
+        return cls(
+            _game_id(g),
+            d.replace(tzinfo=timezone.utc) if d else None,
+            (g.get("game_mode") or "").strip().upper(),
+            (g.get("home_full_name") or "").strip(),
+            (g.get("away_full_name") or "").strip(),
+            player_key(g.get("home_name", "")),
+            player_key(g.get("away_name", "")),
+            "H" if hr == "W" else ("A" if ar == "W" else None),
+            str(g.get("home_runs") or "0"),
+            str(g.get("away_runs") or "0"),
+            (g.get("display_pitcher_info") or "").strip(),
+            g,
+        )
+
+    @classmethod
+    def from_row(cls, r):
+        """Fila del ledger (columnas de game_ledger.GAME_COLUMNS, sin `raw`)."""
+        d = r["played_at"]
+        return cls(
+            r["id"],
+            datetime.fromisoformat(d).replace(tzinfo=timezone.utc) if d else None,
+            r["game_mode"], r["home_team"], r["away_team"],
+            r["home_user_norm"], r["away_user_norm"], r["winner_side"],
+            r["home_runs"], r["away_runs"], r["pitcher_info"],
+        )
+
+    def ledger_row(self):
+        """Tupla en el orden de game_ledger.GAME_COLUMNS."""
+        return (
+            self.id,
+            self.played_at.strftime("%Y-%m-%d %H:%M:%S") if self.played_at else None,
+            self.mode,
+            self.home_team, self.away_team, self.home_team_key, self.away_team_key,
+            self.home_player, self.away_player, self.winner,
+            self.home_runs, self.away_runs, self.pitcher_info,
+            json.dumps(self.raw, ensure_ascii=False),
+        )
+
+    @property
+    def both_members(self):
+        return self.home_owner is not None and self.away_owner is not None
+
+    @property
+    def league_valid(self):
+        """Filtro de la tabla: ambos miembros, o CPU + miembro."""
+        return self.both_members \
+            or (self.home_player == "cpu" and self.away_owner is not None) \
+            or (self.away_player == "cpu" and self.home_owner is not None)
+
+# ===== Sesión HTTP compartida (keep-alive) =====
+# Un solo pool de conexiones para todos los hilos; el tamaño del pool acompaña a FETCH_WORKERS
+_SESSION = None
+_CLIENT = None
+
+def _get_session():
+    global _SESSION
+    if _SESSION is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(FETCH_WORKERS, 1))
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _SESSION = s
+    return _SESSION
+
+def get_client():
+    """Cliente único del proceso: límite de tasa, reintentos y circuit breaker compartidos por los hilos."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = UpstreamClient(
+            _get_session(), rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, attempts=RETRIES,
+            failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS,
+            timeout=(CONNECT_TIMEOUT, TIMEOUT),
+        )
+    return _CLIENT
+
+# Última versión buena de cada (username, page) en este proceso: si una descarga falla se
+# entrega esa en vez de [] (la página sigue marcada como fallida y el sync no avanza con ella).
+_LAST_GOOD = {}
+_LAST_GOOD_LOCK = threading.Lock()
+
+def _fetch_page_result(username: str, page: int, validator=None):
+    """
+    (juegos, ok, meta, trace). ok=False si falló la descarga (juegos = última versión buena, o []).
+    trace = {"status", "attempts", "seconds"} del pedido (para métricas).
+    Con `validator` ({"etag", "last_modified", "body_hash"} de la versión ya ingerida) el pedido es
+    condicional; si la API responde 304 o el cuerpo trae el mismo hash, meta["unchanged"] = True
+    y no se parsea (juegos = última versión buena en memoria, o []).
+    """
     params = {"username": username, "platform": PLATFORM, "page": page}
-    last = None
-    for _ in range(RETRIES):
-        try:
-            r = requests.get(API, params=params, timeout=TIMEOUT)
-            r.raise_for_status()
-            return (r.json() or {}).get("game_history") or []
-        except Exception as e:
-            last = e
-            time.sleep(0.4)
-    print(f"[WARN] {username} p{page} sin datos ({last})")
-    return []
+    headers = {}
+    if validator and validator.get("etag"):
+        headers["If-None-Match"] = validator["etag"]
+    if validator and validator.get("last_modified"):
+        headers["If-Modified-Since"] = validator["last_modified"]
+    t0 = time.perf_counter()
+    try:
+        r = get_client().get(API, params=params, headers=headers or None)
+        trace = {"status": r.status_code, "attempts": r.attempts, "seconds": round(r.total_seconds, 4)}
+        if r.status_code == 304:
+            meta = dict(validator, unchanged=True)
+        else:
+            meta = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "body_hash": hashlib.sha1(r.content).hexdigest(),
+            }
+            meta["unchanged"] = bool(validator) and validator.get("body_hash") == meta["body_hash"]
+        if meta["unchanged"]:
+            with _LAST_GOOD_LOCK:
+                return _LAST_GOOD.get((username, page)) or [], True, meta, trace
+        items = (r.json() or {}).get("game_history") or []
+    except (UpstreamError, ValueError) as e:
+        with _LAST_GOOD_LOCK:
+            items = _LAST_GOOD.get((username, page))
+        print(f"[WARN] {username} p{page} sin datos ({e}){' - se usa la última versión buena' if items is not None else ''}")
+        trace = {"status": getattr(e, "status", None) or "error", "attempts": getattr(e, "attempts", 1),
+                 "seconds": round(time.perf_counter() - t0, 4)}
+        return items or [], False, None, trace
+    with _LAST_GOOD_LOCK:
+        _LAST_GOOD[(username, page)] = items
+    return items, True, meta, trace
+
+def fetch_page(username: str, page: int):
+    return _fetch_page_result(username, page)[0]
+
+def fetch_pages(keys, workers=None, failed=None, validators=None, meta=None, trace=None):
+    """
+    Descarga en paralelo una lista de (username, page).
+    Devuelve dict {(username, page): [juegos]} con el mismo contenido que fetch_page.
+    Si se pasa el set `failed`, se le agregan las claves cuya descarga falló.
+    `validators` {(username, page): {...}} hace condicionales esos pedidos; en el dict `meta`
+    se dejan los validadores de cada respuesta (y si la página no cambió); en `trace`, status/intentos/segundos.
+    """
+    keys = list(dict.fromkeys(keys))  # sin repetidos, conserva el orden
+    validators = validators or {}
+    workers = max(1, min(workers or FETCH_WORKERS, len(keys) or 1))
+    if workers == 1:
+        results = [_fetch_page_result(*k, validators.get(k)) for k in keys]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(lambda k: _fetch_page_result(*k, validators.get(k)), keys))
+    out = {}
+    for k, (items, ok, m, t) in zip(keys, results):
+        out[k] = items
+        if trace is not None:
+            trace[k] = t
+        if not ok and failed is not None:
+            failed.add(k)
+        if m is not None and meta is not None:
+            meta[k] = m
+    return out
+
+class PageStore:
+    """
+    Páginas descargadas durante UN ciclo de actualización.
+    Tabla y juegos de hoy leen de aquí, así cada (username, page) se pide una sola vez por ciclo.
+    stats: requests = descargas reales a la API, avoided = lecturas servidas desde el store,
+           unchanged = páginas iguales a la ya ingerida (304 o mismo hash), reprocessed = páginas nuevas/cambiadas.
+    `validators` = validadores por (username, page) para pedidos condicionales; `meta` = los de cada respuesta.
+    `trace` = {(username, page): {"status", "attempts", "seconds"}} de cada descarga (métricas).
+    `synced` = usuarios ya sincronizados contra el ledger en este ciclo.
+    `skip`   = usuarios que este ciclo NO se consultan (se usa lo que ya hay en el ledger).
+    `new_games` = {usuario: juegos nuevos ingeridos en este ciclo}.
+    `new_players` = player_key() de ambos lados de los juegos que el ledger ve por primera vez
+                    (el scheduler adelanta a los rivales que no se consultaron).
+    """
+    def __init__(self, workers=None, skip=()):
+        self.workers = workers
+        self.pages = {}
+        self.failed = set()
+        self.synced = set(skip)
+        self.new_games = {}
+        self.new_players = set()
+        self.validators = {}
+        self.meta = {}
+        self.trace = {}
+        self.stats = {"requests": 0, "avoided": 0, "skipped": len(self.synced), "unchanged": 0, "reprocessed": 0}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            missing = [k for k in keys if k not in self.pages]
+            self.stats["avoided"] += len(keys) - len(missing)
+            if missing:
+                self.pages.update(fetch_pages(missing, workers=self.workers, failed=self.failed,
+                                              validators=self.validators, meta=self.meta, trace=self.trace))
+                self.stats["requests"] += len(missing)
+                for k in missing:
+                    if k in self.meta:
+                        self.stats["unchanged" if self.meta[k]["unchanged"] else "reprocessed"] += 1
+            return {k: self.pages[k] for k in keys}
+
+    def get(self, username: str, page: int):
+        return self.get_many([(username, page)])[(username, page)]
+
+def league_usernames(order=None):
+    """Cuentas a sincronizar: principal + alias de cada participante."""
+    names = []
+    for user_exact, _team in (LEAGUE_ORDER if order is None else order):
+        names += [user_exact] + FETCH_ALIASES.get(user_exact, [])
+    return list(dict.fromkeys(names))
+
+# ===== Ligas =====
+# La liga de las constantes de este módulo es DEFAULT_LEAGUE; las demás vienen de data/leagues/
+# (ver leagues.py). Todas comparten el ledger: cada cuenta se descarga una vez aunque juegue en varias.
+def default_league():
+    """League armada con las constantes actuales del módulo (LEAGUE_ORDER, SINCE, MODE, ajustes)."""
+    return League(
+        DEFAULT_LEAGUE, LEAGUE_ORDER, SINCE, mode=MODE, aliases=FETCH_ALIASES,
+        extra_members=LEAGUE_USERS, record_adjustments=TEAM_RECORD_ADJUSTMENTS,
+        point_adjustments=TEAM_POINT_ADJUSTMENTS, scheduled=45,
+    )
+
+def all_leagues():
+    """{slug: League}: la liga por defecto primero, luego las de data/leagues/."""
+    leagues = {DEFAULT_LEAGUE: default_league()}
+    leagues.update(load_league_files())
+    return leagues
+
+# ===== Ledger local (SQLite) =====
+# Todo lo sincronizado se guarda en data/ledger.sqlite3 (ver game_ledger.py); la tabla y los
+# juegos de hoy son consultas sobre el ledger, no recorridos sobre páginas.
+_LEDGER = None
+_LEDGER_SINCE = None   # inicio de la cobertura del ledger (meta "since", ISO)
+
+_CAPTURE = None
+
+def get_capture_log():
+    global _CAPTURE
+    if _CAPTURE is None:
+        _CAPTURE = CaptureLog(CAPTURE_FILE)
+    return _CAPTURE
+
+def get_ledger(since=None):
+    """
+    Ledger compartido. `since`: inicio que necesita el llamador (por defecto SINCE); si es anterior
+    a la cobertura guardada, se re-sincroniza desde ahí. Un inicio posterior ya está cubierto.
+    """
+    global _LEDGER, _LEDGER_SINCE
+    since = (since or SINCE).isoformat()
+    if _LEDGER is None:
+        _LEDGER = GameLedger()
+        _LEDGER_SINCE = _LEDGER.get_meta("since")
+    if _LEDGER_SINCE is None or since < _LEDGER_SINCE:
+        # La cobertura anterior empieza después: no sirve para este inicio
+        _LEDGER.reset_sync_state()
+        _LEDGER.set_meta("since", since)
+        _LEDGER_SINCE = since
+    _apply_exclusions(_LEDGER)
+    return _LEDGER
+
+def _apply_exclusions(ledger):
+    """Si cambiaron las reglas de exclusión desde la última marca del ledger, remarca todos sus juegos."""
+    rules = exclusions.load_rules()
+    if ledger.get_meta("exclusions", "") == rules.signature:
+        return
+    ids = [r["id"] for r in ledger.exclusion_candidates()
+           if rules.excluded(r["id"], r["home_team"], r["away_team"], r["home_runs"], r["away_runs"], r["played_at"])]
+    ledger.set_excluded(ids)
+    ledger.set_meta("exclusions", rules.signature)
+    print(f"[exclusiones] {len(rules)} regla(s); {len(ids)} juego(s) anulado(s) en el ledger")
+
+def _coverage_since(ledger):
+    """Inicio de la cobertura del ledger (hasta dónde baja el sync)."""
+    stored = ledger.get_meta("since")
+    return datetime.fromisoformat(stored) if stored else SINCE
+
+def _game_id(g):
+    gid = str(g.get("id") or "")
+    if gid:
+        return gid
+    # Sin id en el payload: id estable derivado del contenido
+    return "noid:" + hashlib.sha1(json.dumps(g, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def _since_key():
+    return SINCE.strftime("%Y-%m-%d %H:%M:%S")
+
+SINCE_UTC = SINCE.replace(tzinfo=timezone.utc)
+
+# ===== Sync incremental del historial (high-water mark por usuario) =====
+# sync_state por usuario en el ledger:
+#   newest_id   = id más reciente visto
+#   oldest_date = fecha más antigua cubierta
+#   complete    = 1 si la cobertura llega hasta el inicio del ledger (o al final del historial)
+def _sync_page_done(records, known, since_utc=SINCE_UTC):
+    """True si esta página ya toca juegos conocidos o anteriores al inicio (no hace falta seguir)."""
+    for rec in records:
+        if rec.id in known:
+            return True
+        if rec.played_at and rec.played_at < since_utc:
+            return True
+    return False
+
+def sync_histories(usernames, store=None, ledger=None):
+    """
+    Trae lo nuevo de cada usuario partiendo en p1 y bajando de página solo mientras haga falta,
+    y lo guarda (upsert) en el ledger.
+    Las páginas se piden por rondas (p1 de todos, luego p2 de los que siguen, ...) en paralelo.
+    Baja hasta el inicio de la cobertura del ledger (la liga con el inicio más antiguo).
+    Un usuario que llega a MAX_PAGES sin terminar se ingiere igual (cobertura incompleta + next_page):
+    el ciclo siguiente trae lo nuevo de arriba y sigue bajando desde next_page.
+    """
+    store = store if store is not None else PageStore()
+    ledger = ledger or get_ledger()
+    usernames = list(dict.fromkeys(usernames))
+    reused = {u for u in usernames if u in store.synced}
+    # Historial ya sincronizado en este ciclo: sus páginas no se vuelven a pedir
+    store.stats["avoided"] += sum(1 for (u, _p) in store.pages if u in reused)
+    usernames = [u for u in usernames if u not in store.synced]
+    if not usernames:
+        return ledger
+    states = ledger.get_sync_state(usernames)
+    since = _coverage_since(ledger)
+    since_utc = since.replace(tzinfo=timezone.utc)
+
+    known, known_all = {}, {}
+    for u in usernames:
+        known_all[u] = ledger.known_ids(u)
+        # Sólo se corta en ids conocidos si la cobertura previa está completa
+        known[u] = known_all[u] if (states.get(u) or {}).get("complete") else set()
+    # Pedidos condicionales sólo con cobertura completa: una página sin cambios ya está en el ledger
+    store.validators.update(ledger.page_validators([u for u in usernames if known[u]]))
+
+    fresh = {u: [] for u in usernames}
+    parsed = {u: [] for u in usernames}   # páginas leídas (cambiadas) por usuario
+    reached_end = set()
+    failed = set()
+    capped = set()                        # llegaron a MAX_PAGES sin terminar
+    # Página siguiente de cada usuario; un backfill cortado en un ciclo anterior (resume) primero trae
+    # lo nuevo desde p1 hasta topar con ids ya ingeridos y luego salta a su next_page
+    cursor = dict.fromkeys(usernames, 1)
+    resume = {u: (states.get(u) or {}).get("next_page") if known_all[u] and not known[u] else None
+              for u in usernames}
+    fetched = dict.fromkeys(usernames, 0)
+    pending = list(usernames)
+    while pending:
+        got = store.get_many([(u, cursor[u]) for u in pending])
+        nxt = []
+        for u in pending:
+            page = cursor[u]
+            fetched[u] += 1
+            if (u, page) in store.failed:
+                failed.add(u)
+                continue
+            if store.meta.get((u, page), {}).get("unchanged"):
+                # Igual a la versión ya ingerida: su aporte ya está en el ledger, no se parsea ni se baja más
+                continue
+            items = got[(u, page)]
+            parsed[u].append(page)
+            if not items:
+                reached_end.add(u)
+                continue
+            if PRINT_CAPTURE_LIST:
+                for g in items:
+                    print(f"    [cap] {u} p{page} id={g.get('id')}  {g.get('away_full_name','')} @ {g.get('home_full_name','')}  {g.get('display_date','')}")
+            records = [GameRecord.from_api(g) for g in items]  # único parseo del payload
+            fresh[u] += records
+            if _sync_page_done(records, known[u], since_utc):
+                continue
+            cursor[u] = page + 1
+            if resume[u] and _sync_page_done(records, known_all[u], since_utc):
+                # Lo nuevo ya está: el backfill sigue donde quedó el ciclo anterior
+                cursor[u] = max(resume[u], page + 1)
+                resume[u] = None
+            if fetched[u] >= MAX_PAGES:
+                capped.add(u)
+                continue
+            nxt.append(u)
+        pending = nxt
+
+    captured = []
+    rules = exclusions.load_rules()
+    for u in usernames:
+        store.synced.add(u)
+        if u in failed:
+            # Cobertura con huecos: no se guarda, el próximo ciclo reintenta desde el estado anterior
+            continue
+        if not fresh[u] and known[u] and u not in reached_end:
+            # Sólo páginas sin cambios: nada que ingerir
+            store.new_games[u] = 0
+            continue
+        st = states.get(u) or {}
+        seen = set()
+        rows = [rec.ledger_row() for rec in fresh[u] if not (rec.id in seen or seen.add(rec.id))]
+        store.new_games[u] = sum(1 for r in rows if r[0] not in known_all[u])
+        first_seen = {r[0] for r in rows if r[0] not in known_all[u]}
+        first_seen -= ledger.existing_ids(first_seen)
+        for rec in fresh[u]:
+            if rec.id in first_seen:
+                store.new_players.update((rec.home_player, rec.away_player))
+        if CAPTURE_ENABLED:
+            captured += [(u, rec.id, rec.raw) for rec in fresh[u] if rec.id not in known_all[u]]
+        dates = [r[1] for r in rows if r[1]]
+        oldest = min(dates + ([st["oldest_date"]] if known_all[u] and st.get("oldest_date") else []), default=None)
+        if u in capped:
+            print(f"[WARN] {u}: MAX_PAGES ({MAX_PAGES}) alcanzado; el backfill sigue en la página {cursor[u]} el próximo ciclo")
+        ledger.ingest(
+            u, rows,
+            newest_id=rows[0][0] if rows else st.get("newest_id"),
+            oldest_date=oldest,
+            complete=u not in capped and (bool(known[u]) or u in reached_end
+                                          or (oldest is not None and oldest < since.strftime("%Y-%m-%d %H:%M:%S"))),
+            next_page=cursor[u],
+            validators={p: store.meta[(u, p)] for p in parsed[u] if (u, p) in store.meta},
+            # Exclusiones al ingerir: la tabla, los juegos de hoy y el calendario ya no ven estos juegos
+            excluded={rec.id for rec in fresh[u] if rules.excluded(
+                rec.id, rec.home_team, rec.away_team, rec.home_runs, rec.away_runs, rec.played_at)},
+        )
+    if captured:
+        # Una sola escritura por sync (un miembro gzip); los repetidos se descartan en el log
+        get_capture_log().append(captured)
+    return ledger
 
 def dedup_by_id(gs):
     seen = set(); out = []
@@ -205,90 +690,128 @@ def dedup_by_id(gs):
 def norm_team(s: str) -> str:
     return (s or "").strip().lower()
 
-def compute_team_record_for_user(username_exact: str, team_name: str):
-    # 1) Descargar páginas del usuario PRINCIPAL y de sus ALIAS; luego deduplicar globalmente por id
-    pages_raw = []
-    usernames_to_fetch = [username_exact] + FETCH_ALIASES.get(username_exact, [])
-    for uname in usernames_to_fetch:
-        for p in PAGES:
-            page_items = fetch_page(uname, p)
-            pages_raw += page_items
-            if PRINT_CAPTURE_LIST:
-                for g in page_items:
-                    print(f"    [cap] {uname} p{p} id={g.get('id')}  {g.get('away_full_name','')} @ {g.get('home_full_name','')}  {g.get('display_date','')}")
-    pages_dedup = dedup_by_id(pages_raw)
-
-    # 2) Filtrar: LEAGUE + fecha + que juegue ese equipo + rival válido
-    considered = []
-    for g in pages_dedup:
-        if (g.get("game_mode") or "").strip().upper() != MODE:
-            continue
-        d = parse_date(g.get("display_date",""))
-        if not d or d < SINCE:
-            continue
-
-        home = (g.get("home_full_name") or "").strip()
-        away = (g.get("away_full_name") or "").strip()
-        if norm_team(team_name) not in (norm_team(home), norm_team(away)):
-            continue
-
-        # Filtro: ambos miembros o CPU + miembro
-        home_name_raw = g.get("home_name","")
-        away_name_raw = g.get("away_name","")
-        h_norm = normalize_user_for_compare(home_name_raw)
-        a_norm = normalize_user_for_compare(away_name_raw)
-        h_mem = h_norm in LEAGUE_USERS_NORM
-        a_mem = a_norm in LEAGUE_USERS_NORM
-        if not ( (h_mem and a_mem) or (is_cpu(home_name_raw) and a_mem) or (is_cpu(away_name_raw) and h_mem) ):
-            continue
-
-        considered.append(g)
-
-    # === Captura/dumps por usuario principal ===
-    if PRINT_CAPTURE_SUMMARY:
-        print(f"    [capturas] {team_name} ({username_exact}): raw={len(pages_raw)}  dedup={len(pages_dedup)}  considerados={len(considered)}")
-    if DUMP_ENABLED:
-        base = _safe_name(username_exact)
-        _dump_json(f"{base}_raw.json", pages_raw)
-        _dump_json(f"{base}_dedup.json", pages_dedup)
-        _dump_json(f"{base}_considered.json", considered)
+_RECORDS_MEMO = {}
 
-    # 3) Contar W/L
-    wins = losses = 0
-    detail_lines = []
-    for g in considered:
-        home = (g.get("home_full_name") or "").strip()
-        away = (g.get("away_full_name") or "").strip()
-        hr = (g.get("home_display_result") or "").strip().upper()
-        ar = (g.get("away_display_result") or "").strip().upper()
-        dt = g.get("display_date","")
-        if hr == "W":
+def compute_league_records(ledger, order=None, league=None):
+    """
+    W/L de todos los equipos en UNA pasada por los juegos únicos de la liga.
+    Un juego se acredita a un equipo sólo si está en el historial de su dueño (principal o alias),
+    igual que el conteo por equipo. Devuelve {norm_team: (wins, losses)}.
+    `league`: League a calcular (por defecto la de las constantes del módulo).
+    """
+    lg = league or default_league()
+    order = lg.order if order is None else order
+    # Sin ingestas nuevas desde la última vez, el resultado es el mismo: se reutiliza (por liga)
+    memo_key = (id(ledger), ledger.generation, tuple(order), lg.since_key, lg.mode)
+    memo = _RECORDS_MEMO.get(lg.slug)
+    if memo and memo[0] == memo_key:
+        return dict(memo[1])
+    owners = {}  # norm_team -> cuentas del participante
+    for user_exact, team_name in order:
+        owners[norm_team(team_name)] = set([user_exact] + lg.aliases.get(user_exact, []))
+    records = {t: [0, 0] for t in owners}
+
+    for _gid, home, away, side, sources in ledger.league_games(
+            lg.usernames(order), sorted(lg.members_norm), lg.mode, lg.since_key):
+        if side == "H":
             win, lose = home, away
-        elif ar == "W":
+        elif side == "A":
             win, lose = away, home
         else:
             continue
+        if win in owners and not owners[win].isdisjoint(sources):
+            records[win][0] += 1
+        if lose != win and lose in owners and not owners[lose].isdisjoint(sources):
+            records[lose][1] += 1
+    records = {t: tuple(wl) for t, wl in records.items()}
+    _RECORDS_MEMO[lg.slug] = (memo_key, records)
+    return dict(records)
+
+def build_game_index(ledger, league=None):
+    """
+    Índices de los juegos que cuentan en la tabla (mismo criterio que compute_league_records),
+    del más nuevo al más antiguo:
+      teams: {norm_team: [juego]}   juegos acreditados a ese equipo
+      h2h:   {"a|b": [juego]}       entre dos equipos de la liga (a < b, normalizados)
+    juego = {id, played_at (UTC), home, away, home_runs, away_runs, winner}
+    """
+    lg = league or default_league()
+    owners = {norm_team(t): set([u] + lg.aliases.get(u, [])) for u, t in lg.order}
+    teams, h2h = {t: [] for t in owners}, {}
+    for r in ledger.league_game_log(lg.usernames(), sorted(lg.members_norm), lg.mode, lg.since_key):
+        if r["winner_side"] not in ("H", "A"):
+            continue
+        home, away = r["home_team_norm"], r["away_team_norm"]
+        counted = [t for t in dict.fromkeys((home, away)) if t in owners and not owners[t].isdisjoint(r["sources"])]
+        if not counted:
+            continue
+        game = {
+            "id": r["id"],
+            "played_at": r["played_at"],
+            "home": r["home_team"],
+            "away": r["away_team"],
+            "home_runs": r["home_runs"],
+            "away_runs": r["away_runs"],
+            "winner": r["home_team"] if r["winner_side"] == "H" else r["away_team"],
+        }
+        for t in counted:
+            teams[t].append(game)
+        if home != away and home in owners and away in owners:
+            h2h.setdefault("|".join(sorted((home, away))), []).append(game)
+    return {"teams": teams, "h2h": h2h}
+
+def compute_team_record_for_user(username_exact: str, team_name: str, store=None, ledger=None, records=None,
+                                 league=None):
+    # 1) Historial del usuario PRINCIPAL y de sus ALIAS (sync incremental hacia el ledger)
+    #    (si viene `ledger`, el llamador ya sincronizó: compute_rows lo hace una vez para toda la liga)
+    #    (`league`: League del equipo; por defecto la de las constantes del módulo)
+    lg = league or default_league()
+    usernames_to_fetch = [username_exact] + lg.aliases.get(username_exact, [])
+    if ledger is None:
+        ledger = sync_histories(usernames_to_fetch, store, ledger=get_ledger(lg.since))
+
+    # 2) + 3) Filtro (LEAGUE + fecha + equipo + rival válido) y conteo W/L: una consulta al ledger
+    #         (cada juego cuenta una vez aunque aparezca en el historial del principal y de un alias)
+    #         (con `records` de compute_league_records el W/L ya viene calculado)
+    members = sorted(lg.members_norm)
+    if records is not None and norm_team(team_name) in records:
+        wins, losses = records[norm_team(team_name)]
+    else:
+        wins, losses = ledger.team_record(norm_team(team_name), usernames_to_fetch, members, lg.mode, lg.since_key)
 
-        if norm_team(win) == norm_team(team_name):
-            wins += 1
-        elif norm_team(lose) == norm_team(team_name):
-            losses += 1
-
+    detail_lines = []
+    if PRINT_CAPTURE_SUMMARY or PRINT_DETAILS:
+        considered = ledger.team_games(norm_team(team_name), usernames_to_fetch, members, lg.mode, lg.since_key)
+        # (raw/dedup/considered por usuario: python capture_log.py <usuario> [raw|dedup|considered])
+        if PRINT_CAPTURE_SUMMARY:
+            pages_dedup = ledger.user_games(usernames_to_fetch)
+            print(f"    [capturas] {team_name} ({username_exact}): ledger={len(pages_dedup)}  considerados={len(considered)}")
         if PRINT_DETAILS:
-            detail_lines.append(f"{dt}  {away} @ {home} -> ganó {win}")
+            for g in considered:
+                home = (g.get("home_full_name") or "").strip()
+                away = (g.get("away_full_name") or "").strip()
+                hr = (g.get("home_display_result") or "").strip().upper()
+                ar = (g.get("away_display_result") or "").strip().upper()
+                if hr == "W":
+                    win = home
+                elif ar == "W":
+                    win = away
+                else:
+                    continue
+                detail_lines.append(f"{g.get('display_date','')}  {away} @ {home} -> ganó {win}")
 
     # 4) Ajuste algebraico del equipo (W/L)
-    adj_w, adj_l = TEAM_RECORD_ADJUSTMENTS.get(team_name, (0, 0))
+    adj_w, adj_l = lg.record_adjustments.get(team_name, (0, 0))
     wins_adj, losses_adj = wins + adj_w, losses + adj_l
 
     # 5) Puntos y métricas de tabla
-    scheduled = 45
+    scheduled = lg.scheduled
     played = max(wins_adj + losses_adj, 0)
     remaining = max(scheduled - played, 0)
     points_base = 0 * wins_adj + 0 * losses_adj
 
     # 6) Ajuste manual de PUNTOS (desconexiones, sanciones, etc.)
-    pts_extra, pts_reason = TEAM_POINT_ADJUSTMENTS.get(team_name, (0, ""))
+    pts_extra, pts_reason = lg.point_adjustments.get(team_name, (0, ""))
     points_final = points_base + pts_extra
 
     return {
@@ -311,10 +834,13 @@ def main():
 
     take = len(LEAGUE_ORDER) if STOP_AFTER_N is None else min(STOP_AFTER_N, len(LEAGUE_ORDER))
     rows = []
-    print(f"Procesando {take} equipos (páginas {PAGES})...\n")
+    print(f"Procesando {take} equipos (sync incremental, {FETCH_WORKERS} descargas en paralelo)...\n")
+    store = PageStore()
+    ledger = sync_histories(league_usernames(LEAGUE_ORDER[:take]), store)
+    records = compute_league_records(ledger, LEAGUE_ORDER[:take]) if AGGREGATION == "league" else None
     for i, (user, team) in enumerate(LEAGUE_ORDER[:take], start=1):
         print(f"[{i}/{take}] {team} ({user})...")
-        row = compute_team_record_for_user(user, team)
+        row = compute_team_record_for_user(user, team, store=store, ledger=ledger, records=records)
         rows.append(row)
         # Muestra Pts y, si hay ajuste, indícalo
         adj_note = f" (ajuste pts {row['points_extra']}: {row['points_reason']})" if row["points_extra"] else ""
@@ -344,7 +870,7 @@ def main():
 
     # Reporte de juegos de HOY (Chile) + dump
     try:
-        games_today = games_played_today_scl()
+        games_today = games_played_today_scl(store=store)
     except Exception as e:
         games_today = []
         print(f"\n[WARN] games_played_today_scl falló: {e}")
@@ -361,11 +887,14 @@ def main():
         for i, s in enumerate(games_today, 1):
             print(f"{i:>2}- {s}")
 
+    print(f"\nDescargas API: {store.stats['requests']} (evitadas por el store: {store.stats['avoided']})")
     print(f"\nÚltima actualización: {datetime.now():%Y-%m-%d %H:%M:%S}")
     print(f"JSON generados en: .\\{DUMP_DIR}\\")
     print("  - standings.json")
     print("  - games_today.json")
-    print("  - <usuario>_raw.json / _dedup.json / _considered.json")
+    if CAPTURE_ENABLED:
+        print(f"Capturas (juegos nuevos, append-only): {CAPTURE_FILE}")
+        print("  - python capture_log.py <usuario> [raw|dedup|considered]")
 
 if __name__ == "__main__":
     main()
@@ -373,15 +902,18 @@ if __name__ == "__main__":
 
 # ====== AÑADIR AL FINAL DE standings_cascade_points_desc.py ======
 from zoneinfo import ZoneInfo
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # ==============================
 # Compatibilidad: filas completas
 # ==============================
-def compute_rows():
+@profiled("compute_rows")
+def compute_rows(store=None, league=None):
     """
     Devuelve la lista completa de filas de la tabla.
     Intenta detectar una función por-equipo existente.
+    `store`: PageStore del ciclo (si se comparte con games_played_today_scl no se repiten descargas).
+    `league`: League a calcular (por defecto la de las constantes del módulo).
     """
     func = globals().get("compute_team_record_for_user") \
         or globals().get("compute_team_record") \
@@ -397,18 +929,48 @@ def compute_rows():
     if "LEAGUE_ORDER" not in globals():
         raise RuntimeError("LEAGUE_ORDER no existe en standings_cascade_points_desc.py")
 
+    # Sync de toda la liga hacia el ledger (en paralelo); luego cada equipo es una consulta
+    if store is None:
+        store = PageStore()
+    lg = league or default_league()
+    ledger = None
+    if func is compute_team_record_for_user:
+        ledger = sync_histories(lg.usernames(), store, ledger=get_ledger(lg.since))
+    # AGGREGATION="league": W/L de todos los equipos en una sola pasada por los juegos únicos
+    records = compute_league_records(ledger, league=lg) if ledger is not None and AGGREGATION == "league" else None
+
     rows = []
-    for user_exact, team_name in LEAGUE_ORDER:
-        rows.append(func(user_exact, team_name))
+    for user_exact, team_name in lg.order:
+        if ledger is not None:
+            rows.append(func(user_exact, team_name, store=store, ledger=ledger, records=records, league=lg))
+        else:
+            rows.append(func(user_exact, team_name))
 
     rows.sort(key=lambda r: (-r.get("points", 0), -r.get("wins", 0), r.get("losses", 0)))
     return rows
 
 
+# -------------------------------
+# Juegos de liga jugados (para conciliar con el calendario de semanas)
+# -------------------------------
+def played_league_games(store=None, league=None):
+    """
+    GameRecords de LEAGUE desde SINCE entre dos miembros de la liga, del más antiguo al más nuevo.
+    Sale del ledger (sin ids repetidos); `store` evita re-sincronizar si el ciclo ya lo hizo.
+    """
+    lg = league or default_league()
+    usernames = [username_exact for username_exact, _team in lg.order]
+    ledger = sync_histories(usernames, store, ledger=get_ledger(lg.since))
+    rows = ledger.games_between(usernames, lg.mode, lg.since_key, "9999-12-31 23:59:59")
+    records = [GameRecord.from_row(r) for r in reversed(rows)]
+    return [rec for rec in records if rec.home_player in lg.members_norm and rec.away_player in lg.members_norm]
+
+
 # -------------------------------
 # Juegos jugados HOY (Chile) - FIX TZ + DEDUP EXTRA
 # -------------------------------
-def games_played_today_scl():
+@profiled("games_played_today_scl")
+def games_played_today_scl(store=None, league=None):
     """
     Lista juegos del DÍA (America/Santiago) en formato:
       'Yankees 1 - Brewers 2  - 30-08-2025 - 3:28 pm (hora Chile)'
@@ -416,65 +978,42 @@ def games_played_today_scl():
       - Deduplicación por id y también por (equipos, runs, pitcher_info).
       - Si la fecha viene sin tz, se asume UTC y se convierte a America/Santiago.
       - Se requiere que AMBOS participantes pertenezcan a la liga.
+      - `store`: PageStore del ciclo; reutiliza lo ya descargado por compute_rows.
+      - `league`: League (por defecto la de las constantes del módulo).
     """
     tz_scl = ZoneInfo("America/Santiago")
     tz_utc = ZoneInfo("UTC")
     today_local = datetime.now(tz_scl).date()
 
-    # Traer páginas p1 y p2 de todos los usuarios de la liga
-    all_pages = []
-    for username_exact, _team in LEAGUE_ORDER:
-        for p in PAGES:
-            all_pages += fetch_page(username_exact, p)
+    # Juegos del día (rango UTC del día Chile) de todos los usuarios de la liga, desde el ledger
+    lg = league or default_league()
+    usernames = [username_exact for username_exact, _team in lg.order]
+    ledger = sync_histories(usernames, store, ledger=get_ledger(lg.since))
+    day_start = datetime.combine(today_local, datetime.min.time(), tzinfo=tz_scl).astimezone(tz_utc)
+    day_end = datetime.combine(today_local + timedelta(days=1), datetime.min.time(), tzinfo=tz_scl).astimezone(tz_utc)
+    records = [GameRecord.from_row(r) for r in ledger.games_between(
+        usernames, lg.mode, day_start.strftime("%Y-%m-%d %H:%M:%S"), day_end.strftime("%Y-%m-%d %H:%M:%S"))]
 
     # Deduplicadores
-    seen_ids = set()
     seen_keys = set()  # (home, away, hr, ar, pitcher_info)
     items = []
 
-    for g in dedup_by_id(all_pages):
-        if (g.get("game_mode") or "").strip().upper() != MODE:
-            continue
-
-        d = parse_date(g.get("display_date", ""))
-        if not d:
-            continue
-
-        # Asumir UTC si es naive, luego convertir a SCL
-        if d.tzinfo is None:
-            d = d.replace(tzinfo=tz_utc)
-        d_local = d.astimezone(tz_scl)
-
+    # El ledger ya viene filtrado por modo y rango del día, y sin ids repetidos
+    for rec in records:
+        d_local = rec.played_at.astimezone(tz_scl)
         if d_local.date() != today_local:
             continue
 
         # Ambos jugadores deben pertenecer a la liga
-        home_name_raw = (g.get("home_name") or "")
-        away_name_raw = (g.get("away_name") or "")
-        h_norm = normalize_user_for_compare(home_name_raw)
-        a_norm = normalize_user_for_compare(away_name_raw)
-        if not (h_norm in LEAGUE_USERS_NORM and a_norm in LEAGUE_USERS_NORM):
+        if rec.home_player not in lg.members_norm or rec.away_player not in lg.members_norm:
             continue
 
-        # Dedup por id
-        gid = str(g.get("id") or "")
-        if gid and gid in seen_ids:
-            continue
-
-        home = (g.get("home_full_name") or "").strip()
-        away = (g.get("away_full_name") or "").strip()
-        hr = str(g.get("home_runs") or "0")
-        ar = str(g.get("away_runs") or "0")
-        pitcher_info = (g.get("display_pitcher_info") or "").strip()
+        home, away, hr, ar = rec.home_team, rec.away_team, rec.home_runs, rec.away_runs
 
         # Clave canónica más robusta
-        canon_key = (home, away, hr, ar, pitcher_info)
+        canon_key = (home, away, hr, ar, rec.pitcher_info)
         if canon_key in seen_keys:
             continue
-
-        # Marcar vistos
-        if gid:
-            seen_ids.add(gid)
         seen_keys.add(canon_key)
 
         # Formato de salida
@@ -0,0 +1,215 @@
+# standings_history.py
+# Serie histórica compacta de la tabla: append-only, por columnas (un equipo = una columna) y con deltas.
+# Archivos en el directorio de historia de cada liga:
+#   teams.json   equipos en orden de columna (los nuevos se agregan al final, nunca se reordena)
+#   history.bin  registros = cabecera <IBH (ts epoch UTC, tipo, n) + n entradas <Hhhh:
+#                  tipo 0 (keyframe): (columna, W, L, puntos) de todos los equipos
+#                  tipo 1 (delta):    (columna, dW, dL, dPuntos) sólo de los que cambiaron
+#   history.idx  <II (ts, offset) de cada keyframe
+# Cada HISTORY_KEYFRAME_EVERY registros va un keyframe: una consulta busca en el índice el keyframe
+# anterior al rango y decodifica desde ahí, no desde el principio. Sólo se agrega un registro si
+# algo cambió; un registro a medio escribir al final del archivo se ignora (y el escritor lo recorta).
+import bisect, json, os, struct, tempfile, threading, time
+from array import array
+
+HISTORY_KEYFRAME_EVERY = int(os.getenv("HISTORY_KEYFRAME_EVERY", "64"))
+
+_HEADER = struct.Struct("<IBH")
+_ENTRY = struct.Struct("<Hhhh")
+_INDEX = struct.Struct("<II")
+KEYFRAME, DELTA = 0, 1
+
+
+def _norm(s):
+    return (s or "").strip().lower()
+
+def _iter_records(buf):
+    """(fin, ts, tipo, [(columna, a, b, c)]) de cada registro completo de `buf`."""
+    offset, size = 0, len(buf)
+    while offset + _HEADER.size <= size:
+        ts, kind, n = _HEADER.unpack_from(buf, offset)
+        end = offset + _HEADER.size + n * _ENTRY.size
+        if end > size:
+            return
+        entries = [_ENTRY.unpack_from(buf, offset + _HEADER.size + i * _ENTRY.size) for i in range(n)]
+        yield end, ts, kind, entries
+        offset = end
+
+
+class _State:
+    """W / L / puntos por columna (arrays) + columnas que ya tienen valor."""
+    def __init__(self, n):
+        self.wins, self.losses, self.points = array("h", [0] * n), array("h", [0] * n), array("h", [0] * n)
+        self.known = set()
+
+    def grow(self, n):
+        extra = n - len(self.wins)
+        if extra > 0:
+            for col in (self.wins, self.losses, self.points):
+                col.extend([0] * extra)
+
+    def apply(self, kind, entries):
+        """Aplica un registro; devuelve las columnas cuyo valor cambió."""
+        self.grow(max((e[0] for e in entries), default=-1) + 1)
+        changed = []
+        for col, a, b, c in entries:
+            if kind == DELTA:
+                a, b, c = self.wins[col] + a, self.losses[col] + b, self.points[col] + c
+            if col not in self.known or (self.wins[col], self.losses[col], self.points[col]) != (a, b, c):
+                changed.append(col)
+            self.wins[col], self.losses[col], self.points[col] = a, b, c
+            self.known.add(col)
+        return changed
+
+    def value(self, col):
+        return self.wins[col], self.losses[col], self.points[col]
+
+
+class HistoryStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.teams_file = os.path.join(directory, "teams.json")
+        self.data_file = os.path.join(directory, "history.bin")
+        self.index_file = os.path.join(directory, "history.idx")
+        self._lock = threading.Lock()
+        self._state = None         # estado del último registro (sólo escritor)
+        self._teams = None
+        self._since_keyframe = 0
+
+    # ----- lectura -----
+    def _read_teams(self):
+        try:
+            with open(self.teams_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _read_index(self):
+        """(ts, offsets) de los keyframes como arrays."""
+        ts, offsets = array("I"), array("I")
+        try:
+            with open(self.index_file, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return ts, offsets
+        for i in range(len(raw) // _INDEX.size):
+            t, off = _INDEX.unpack_from(raw, i * _INDEX.size)
+            ts.append(t)
+            offsets.append(off)
+        return ts, offsets
+
+    def _read_from(self, ts_from):
+        """(offset, bytes) desde el último keyframe con ts <= ts_from."""
+        kts, koffs = self._read_index()
+        i = bisect.bisect_right(kts, ts_from) - 1
+        offset = koffs[i] if i >= 0 else 0
+        try:
+            with open(self.data_file, "rb") as f:
+                f.seek(offset)
+                return offset, f.read()
+        except OSError:
+            return offset, b""
+
+    def read(self, start=None, end=None, team=None):
+        """
+        Serie en [start, end] (epoch UTC): [(ts, {equipo: (W, L, puntos)})].
+        El primer punto es el estado completo vigente en `start` (si había); los siguientes traen sólo
+        los equipos que cambiaron. Con `team`, sólo los puntos en que cambió ese equipo.
+        """
+        teams = self._read_teams()
+        start = 0 if start is None else int(start)
+        end = 2 ** 32 - 1 if end is None else int(end)
+        cols = range(len(teams))
+        if team is not None:
+            cols = [i for i, t in enumerate(teams) if _norm(t) == _norm(team)]
+            if not cols:
+                return []
+        wanted = set(cols)
+        state = _State(len(teams))
+        out, opened = [], False
+
+        def point(ts, changed):
+            values = {teams[c]: state.value(c) for c in changed if c in wanted and c < len(teams)}
+            if values:
+                out.append((ts, values))
+
+        _offset, buf = self._read_from(start)
+        for _end, ts, kind, entries in _iter_records(buf):
+            if ts > end:
+                break
+            if ts > start and not opened:
+                opened = True
+                point(start, sorted(state.known))
+            changed = state.apply(kind, entries)
+            if ts > start:
+                point(ts, changed)
+        if not opened and start:
+            point(start, sorted(state.known))
+        return out
+
+    # ----- escritura -----
+    def _recover(self):
+        """Estado del último registro; recorta un registro incompleto al final."""
+        self._teams = self._read_teams()
+        offset, buf = self._read_from(2 ** 32 - 1)
+        state = _State(len(self._teams))
+        last_end, count = 0, 0
+        for end, _ts, kind, entries in _iter_records(buf):
+            state.apply(kind, entries)
+            count = 0 if kind == KEYFRAME else count + 1
+            last_end = end
+        if last_end < len(buf):
+            with open(self.data_file, "r+b") as f:
+                f.truncate(offset + last_end)
+        self._state, self._since_keyframe = state, count
+
+    def _write_teams(self):
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._teams, f, ensure_ascii=False)
+        os.chmod(tmp, 0o644)  # mkstemp crea con 0600
+        os.replace(tmp, self.teams_file)
+
+    def append(self, rows, ts=None):
+        """Agrega la tabla `rows` (filas de compute_rows) si cambió algo. Devuelve True si escribió."""
+        ts = int(time.time() if ts is None else ts)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self._state is None:
+                self._recover()
+            columns = {_norm(t): i for i, t in enumerate(self._teams)}
+            new_teams = False
+            values = {}
+            for r in rows:
+                key = _norm(r.get("team"))
+                if key not in columns:
+                    columns[key] = len(self._teams)
+                    self._teams.append(r.get("team"))
+                    new_teams = True
+                values[columns[key]] = (int(r.get("wins", 0)), int(r.get("losses", 0)), int(r.get("points", 0)))
+            state = self._state
+            state.grow(len(self._teams))
+            changed = [c for c, v in sorted(values.items()) if c not in state.known or state.value(c) != v]
+            if not changed:
+                return False
+            if new_teams:
+                self._write_teams()
+
+            keyframe = not state.known or self._since_keyframe + 1 >= HISTORY_KEYFRAME_EVERY
+            if keyframe:
+                full = {c: state.value(c) for c in state.known}
+                full.update(values)
+                entries = [(c,) + full[c] for c in sorted(full)]
+            else:
+                entries = [(c,) + tuple(n - o for n, o in zip(values[c], state.value(c))) for c in changed]
+            record = _HEADER.pack(ts, KEYFRAME if keyframe else DELTA, len(entries)) \
+                + b"".join(_ENTRY.pack(*e) for e in entries)
+            with open(self.data_file, "ab") as f:
+                offset = f.tell()
+                f.write(record)
+            if keyframe:
+                with open(self.index_file, "ab") as f:
+                    f.write(_INDEX.pack(ts, offset))
+            state.apply(KEYFRAME if keyframe else DELTA, entries)
+            self._since_keyframe = 0 if keyframe else self._since_keyframe + 1
+            return True
@@ -0,0 +1,101 @@
+# Deltas de /api/full?since=<versión> (app.compute_delta + get_delta_body).
+import copy, json, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as web
+
+SKIP = {"delta", "since", "version", "removed", "standings_changed", "standings_order",
+        "games_today", "games_today_added", "semanas", "fixtures_changed"}
+
+
+def apply_delta(state, d):
+    """Lo mismo que applyDelta() de templates/index.html."""
+    state = copy.deepcopy(state)
+    by_team = {r.get("team") or r.get("user"): r for r in state.get("standings", [])}
+    for r in d.get("standings_changed", []):
+        k = r.get("team") or r.get("user")
+        if k in by_team:
+            by_team[k].update(r)
+        else:
+            state["standings"].append(r)
+            by_team[k] = r
+    if "standings_order" in d:
+        state["standings"] = [by_team[k] for k in d["standings_order"] if k in by_team]
+    if "games_today" in d:
+        state["games_today"] = d["games_today"]
+    if "games_today_added" in d:
+        state["games_today"] = state.get("games_today", []) + d["games_today_added"]
+    if "semanas" in d:
+        state["semanas"] = d["semanas"]
+    for f in d.get("fixtures_changed", []):
+        j = state["semanas"][f["semana"]][f["pos"]]
+        j["estado"], j["resultado"] = f["estado"], f["resultado"]
+    for k in d.get("removed", []):
+        state.pop(k, None)
+    state.update({k: v for k, v in d.items() if k not in SKIP})
+    return state
+
+
+def _payload():
+    return {
+        "standings": [{"team": "Yankees", "wins": 2, "losses": 0}, {"team": "Mets", "wins": 0, "losses": 2}],
+        "games_today": ["Yankees 5 - Mets 2"],
+        "semana_actual": 3,
+        "semanas": {"3": [{"local": "Yankees", "visitante": "Mets", "estado": "Pendiente", "resultado": ""}]},
+        "last_updated": "2025-09-08 21:40:00",
+        "overrides_error": "x",
+    }
+
+
+def test_compute_delta_round_trips():
+    old = _payload()
+    new = copy.deepcopy(old)
+    new["standings"] = [{"team": "Mets", "wins": 3, "losses": 2}, {"team": "Yankees", "wins": 2, "losses": 3}]
+    new["games_today"].append("Mets 4 - Yankees 1")
+    new["semanas"]["3"][0].update(estado="JUGADO", resultado="1-4")
+    new["last_updated"] = "2025-09-08 22:10:00"
+    del new["overrides_error"]
+    delta = web.compute_delta(old, new)
+    assert delta["games_today_added"] == ["Mets 4 - Yankees 1"]
+    assert delta["fixtures_changed"] == [{"semana": "3", "pos": 0, "estado": "JUGADO", "resultado": "1-4"}]
+    assert delta["removed"] == ["overrides_error"]
+    assert apply_delta(old, delta) == new
+
+
+def test_compute_delta_structure_change_sends_full_weeks():
+    old = _payload()
+    new = copy.deepcopy(old)
+    new["semanas"]["4"] = [{"local": "Mets", "visitante": "Yankees", "estado": "Pendiente", "resultado": ""}]
+    new["games_today"] = []
+    delta = web.compute_delta(old, new)
+    assert delta["semanas"] == new["semanas"] and delta["games_today"] == []
+    assert web.compute_delta(new, new) == {}
+    assert apply_delta(old, delta) == new
+
+
+def test_api_full_since_serves_delta(tmp_path, monkeypatch):
+    cache = tmp_path / "standings_cache.json"
+    cache.write_text(json.dumps({"standings": _payload()["standings"], "games_today": []}), encoding="utf-8")
+    monkeypatch.setattr(web, "CACHE_FILE", str(cache))
+    monkeypatch.setattr(web, "SEMANAS_FILE", str(tmp_path / "semanas.json"))
+    monkeypatch.setattr(web, "OVERRIDES_FILE", str(tmp_path / "manual_overrides.json"))
+    monkeypatch.setattr(web, "FULL_CACHE_CHECK_SECONDS", 0)
+    monkeypatch.setattr(web, "_FULL_CACHE", {})
+    monkeypatch.setattr(web, "_FULL_HISTORY", {})
+    client = web.app.test_client()
+
+    first = client.get("/api/full")
+    v1 = first.headers["ETag"].strip('"')
+    old = first.get_json()
+    cache.write_text(json.dumps({"standings": [{"team": "Yankees", "wins": 3, "losses": 0},
+                                               {"team": "Mets", "wins": 0, "losses": 3}],
+                                 "games_today": ["Yankees 1 - Mets 0"]}), encoding="utf-8")
+    os.utime(cache, ns=(1, 1))                                  # mtime viejo: igual es una versión nueva
+    full = client.get("/api/full").get_json()
+    delta = client.get(f"/api/full?since={v1}").get_json()
+    assert delta["delta"] is True and delta["since"] == v1
+    assert apply_delta(old, delta) == full
+
+    unknown = client.get("/api/full?since=no-existe").get_json()
+    assert "delta" not in unknown and unknown == full
@@ -0,0 +1,52 @@
+# Reglas de exclusión manual (exclusions.py).
+import os, sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exclusions
+
+# 2025-09-09 00:40 UTC = 2025-09-08 21:40 en Chile (UTC-3)
+PLAYED = datetime(2025, 9, 9, 0, 40, tzinfo=timezone.utc)
+
+
+def _rules(*rules):
+    return exclusions.ExclusionRules(rules, "test")
+
+
+def test_rule_by_id():
+    rules = _rules({"id": 123, "reason": "x"})
+    assert rules.excluded("123", "A", "B", "1", "0", PLAYED)
+    assert not rules.excluded("124", "A", "B", "1", "0", PLAYED)
+
+
+def test_rule_by_teams_score_and_chile_date():
+    rule = {"home_team": "Yankees", "away_team": "Mets", "home_score": 0, "away_score": 0, "date": "2025-09-08"}
+    rules = _rules(rule)
+    assert rules.excluded("1", " yankees", "METS", "0", "0", PLAYED)
+    assert rules.excluded("1", "Yankees", "Mets", "0", "0", "2025-09-09 00:40:00")   # texto UTC del ledger
+    assert not rules.excluded("1", "Yankees", "Mets", "1", "0", PLAYED)
+    assert not rules.excluded("1", "Mets", "Yankees", "0", "0", PLAYED)
+    assert not rules.excluded("1", "Yankees", "Mets", "0", "0", datetime(2025, 9, 8, 2, tzinfo=timezone.utc))   # 07-09 en Chile
+
+
+def test_rule_with_time_and_bad_rules_ignored():
+    rules = _rules({"home_team": "Yankees", "away_team": "Mets", "home_score": 0, "away_score": 0,
+                    "date": "2025-09-08", "time": "21:40"},
+                   {"home_team": "Yankees", "date": "no-es-fecha"})
+    assert len(rules) == 1
+    assert rules.excluded("1", "Yankees", "Mets", "0", "0", PLAYED)
+    assert not rules.excluded("1", "Yankees", "Mets", "0", "0", datetime(2025, 9, 9, 1, 40, tzinfo=timezone.utc))
+
+
+def test_load_rules_reloads_on_change(tmp_path):
+    path = tmp_path / "exclusions.json"
+    path.write_text('{"rules": [{"id": "1"}]}', encoding="utf-8")
+    first = exclusions.load_rules(str(path))
+    assert first.ids == {"1"} and exclusions.load_rules(str(path)) is first
+    path.write_text('{"rules": [{"id": "1"}, {"id": "2"}]}', encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    second = exclusions.load_rules(str(path))
+    assert second.ids == {"1", "2"} and second.signature != first.signature
+    path.write_text("{roto", encoding="utf-8")
+    assert exclusions.load_rules(str(path)) is second          # archivo inválido: se mantienen las anteriores
@@ -0,0 +1,43 @@
+# Serie histórica de la tabla (standings_history.HistoryStore).
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standings_history
+
+
+def _rows(**teams):
+    return [{"team": t, "wins": w, "losses": l, "points": p} for t, (w, l, p) in teams.items()]
+
+
+def test_append_only_on_change_and_read_back(tmp_path):
+    store = standings_history.HistoryStore(str(tmp_path))
+    assert store.append(_rows(Yankees=(1, 0, 3), Mets=(0, 1, 0)), ts=100)
+    assert not store.append(_rows(Yankees=(1, 0, 3), Mets=(0, 1, 0)), ts=110)
+    assert store.append(_rows(Yankees=(2, 0, 6), Mets=(0, 1, 0)), ts=120)
+    assert store.read() == [(100, {"Yankees": (1, 0, 3), "Mets": (0, 1, 0)}), (120, {"Yankees": (2, 0, 6)})]
+    # Desde un instante intermedio: primero el estado completo vigente, luego los cambios
+    assert store.read(start=110) == [(110, {"Yankees": (1, 0, 3), "Mets": (0, 1, 0)}), (120, {"Yankees": (2, 0, 6)})]
+    assert store.read(team="mets") == [(100, {"Mets": (0, 1, 0)})]
+
+
+def test_keyframes_and_new_teams(tmp_path, monkeypatch):
+    monkeypatch.setattr(standings_history, "HISTORY_KEYFRAME_EVERY", 3)
+    store = standings_history.HistoryStore(str(tmp_path))
+    for i in range(10):
+        store.append(_rows(Yankees=(i, 0, 3 * i)), ts=100 + i)
+    store.append(_rows(Yankees=(9, 1, 27), Cubs=(1, 0, 3)), ts=200)
+    reader = standings_history.HistoryStore(str(tmp_path))
+    assert reader.read(start=107, end=108) == [(107, {"Yankees": (7, 0, 21)}), (108, {"Yankees": (8, 0, 24)})]
+    assert reader.read(start=300) == [(300, {"Yankees": (9, 1, 27), "Cubs": (1, 0, 3)})]
+
+
+def test_truncated_record_is_ignored_and_trimmed(tmp_path):
+    store = standings_history.HistoryStore(str(tmp_path))
+    store.append(_rows(Yankees=(1, 0, 3)), ts=100)
+    with open(store.data_file, "ab") as f:
+        f.write(b"\x01\x02\x03")                               # registro cortado a medio escribir
+    assert standings_history.HistoryStore(str(tmp_path)).read() == [(100, {"Yankees": (1, 0, 3)})]
+    writer = standings_history.HistoryStore(str(tmp_path))
+    assert writer.append(_rows(Yankees=(2, 0, 6)), ts=110)
+    assert writer.read() == [(100, {"Yankees": (1, 0, 3)}), (110, {"Yankees": (2, 0, 6)})]
@@ -0,0 +1,63 @@
+# Proyección de playoffs (projections.py) sobre una liga chica fija.
+import copy, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leagues
+import projections
+
+
+def _row(team, wins, losses, remaining, points=0):
+    return {"team": team, "wins": wins, "losses": losses, "remaining": remaining, "points": points}
+
+
+def test_clinch_numbers_small_league():
+    # Máximos posibles: 12, 12, 10, 10; dos cupos
+    magic, elim = projections.clinch_numbers([10, 8, 5, 2], [2, 4, 5, 8], 2)
+    assert magic == [1, 3, 8, 11]
+    assert elim == [8, 8, 3, 3]
+
+
+def test_clinch_numbers_clinched_and_eliminated():
+    # A ya no puede ser alcanzado por C ni D; D ya no alcanza a A ni a B
+    magic, elim = projections.clinch_numbers([20, 15, 4, 2], [0, 3, 3, 3], 2)
+    assert magic[0] == 0
+    assert elim[3] == 0
+
+
+def test_simulate_shrinks_early_records_toward_500():
+    # 3-0 con 42 juegos por delante en una liga de 8 con 4 cupos: favorito, pero nada asegurado
+    rows = [_row("A", 3, 0, 42)] + [_row(t, 1, 2, 42) for t in "BCD"] + [_row(t, 2, 1, 42) for t in "EFGH"]
+    result = projections.simulate(rows, runs=20000, spots=4)
+    teams = {t["team"]: t for t in result["teams"]}
+    assert 0.5 < teams["A"]["playoff_odds"] < 0.9
+    assert teams["A"]["rank_dist"][0] < 0.4
+    assert not teams["A"]["clinched"]
+    assert abs(sum(t["playoff_odds"] for t in result["teams"]) - 4) < 0.01
+    for t in result["teams"]:
+        assert abs(sum(t["rank_dist"]) - 1) < 0.01
+
+
+def test_simulate_respects_clinch_and_is_deterministic():
+    rows = [_row("A", 20, 0, 2), _row("B", 15, 5, 2), _row("C", 2, 18, 2), _row("D", 1, 19, 2)]
+    first = projections.simulate(rows, runs=5000, spots=2)
+    teams = {t["team"]: t for t in first["teams"]}
+    assert teams["A"]["clinched"] and teams["A"]["playoff_odds"] == 1.0
+    assert teams["D"]["eliminated"] and teams["D"]["playoff_odds"] == 0.0
+    projections._MEMO.clear()
+    assert projections.simulate(rows, runs=5000, spots=2) == first
+
+
+def test_manual_overrides_close_fixtures_before_simulating():
+    # Lo que publica la web: conciliados y después manual_overrides.json
+    semanas = {"semana_actual": 3, "semanas": {"3": [
+        {"local": "A", "visitante": "B", "estado": "Pendiente", "resultado": ""},
+        {"local": "C", "visitante": "D", "estado": "Pendiente", "resultado": ""},
+    ]}}
+    published = leagues.apply_fixture_results(copy.deepcopy(semanas), {"3": {"1": {
+        "local": "C", "visitante": "D", "resultado": "2-1", "estado": "JUGADO"}}})
+    leagues.apply_overrides(published, {"1": {"local": "A", "visitante": "B", "estado": "SIMULADO", "resultado": "3-0"}})
+    assert projections.open_fixtures(semanas) == [("A", "B"), ("C", "D")]
+    assert projections.open_fixtures(published) == [("A", "B")]          # SIMULADO sigue abierto
+    leagues.apply_overrides(published, {"1": {"local": "A", "visitante": "B", "estado": "JUGADO"}})
+    assert projections.open_fixtures(published) == []
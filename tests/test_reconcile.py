@@ -0,0 +1,70 @@
+# Conciliación del calendario de semanas con los juegos del ledger (update_cache.reconcile_fixtures).
+import os, sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import update_cache
+
+_IDS = iter(range(1, 10**6))
+
+
+def _game(home, away, hr, ar, when):
+    played_at = datetime.strptime(when, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+    return SimpleNamespace(id=str(next(_IDS)), home_team=home, away_team=away,
+                           home_runs=hr, away_runs=ar, played_at=played_at)
+
+
+def _fixture(local, visitante, estado, resultado=""):
+    return {"local": local, "visitante": visitante, "estado": estado, "resultado": resultado}
+
+
+def _semanas():
+    return {"semana_actual": 3, "semanas": {
+        "2": [_fixture("Yankees", "Mets", "JUGADO", "5-1"),
+              _fixture("Cubs", "Reds", "JUGADO", "3-2"),
+              _fixture("Red Sox", "Dodgers", "SIMULADO")],
+        "3": [_fixture("Red Sox", "Dodgers", "Pendiente"),
+              _fixture("Cubs", "Reds", "Pendiente"),
+              _fixture("Yankees", "Mets", "Pendiente")],
+    }}
+
+
+def test_pending_takes_the_game_played_for_it():
+    games = [_game("Yankees", "Mets", 5, 1, "2025-09-02 01:00"),
+             _game("Cubs", "Reds", 3, 2, "2025-09-03 01:00"),
+             _game("Red Sox", "Dodgers", 6, 3, "2025-09-10 01:00")]
+    results = update_cache.reconcile_fixtures(_semanas(), games)
+    assert results == {"3": {"0": {"local": "Red Sox", "visitante": "Dodgers", "resultado": "6-3",
+                                   "estado": "JUGADO", "game_id": games[2].id}}}
+
+
+def test_old_games_do_not_fill_later_pending_fixtures():
+    games = [_game("Red Sox", "Dodgers", 4, 2, "2025-08-20 01:00"),   # semana 1 (no está en el archivo)
+             _game("Cubs", "Reds", 1, 0, "2025-08-21 01:00"),         # amistoso viejo del mismo par
+             _game("Yankees", "Mets", 5, 1, "2025-09-02 01:00"),
+             _game("Cubs", "Reds", 3, 2, "2025-09-03 01:00")]
+    assert update_cache.reconcile_fixtures(_semanas(), games) == {}
+
+
+def test_mismatched_jugado_consumes_its_game():
+    semanas = _semanas()
+    semanas["semanas"]["2"][0]["resultado"] = "1-5"    # marcador mal cargado
+    games = [_game("Yankees", "Mets", 5, 1, "2025-09-02 01:00"),
+             _game("Cubs", "Reds", 3, 2, "2025-09-03 01:00")]
+    assert update_cache.reconcile_fixtures(semanas, games) == {}
+
+
+def test_explicit_window_excludes_simulated_week_games():
+    semanas = _semanas()
+    semanas["fechas"] = {"2": {"desde": "2025-09-01", "hasta": "2025-09-07"},
+                         "3": {"desde": "2025-09-08", "hasta": "2025-09-14"}}
+    games = [_game("Yankees", "Mets", 5, 1, "2025-09-02 01:00"),
+             _game("Red Sox", "Dodgers", 2, 7, "2025-09-05 01:00"),   # semana 2, fixture SIMULADO
+             _game("Cubs", "Reds", 3, 2, "2025-09-06 01:00"),
+             _game("Yankees", "Mets", 8, 0, "2025-09-12 01:00"),
+             _game("Cubs", "Reds", 9, 9, "2025-09-20 01:00")]         # fuera de la semana 3
+    results = update_cache.reconcile_fixtures(semanas, games)
+    assert list(results) == ["3"] and list(results["3"]) == ["2"]
+    assert results["3"]["2"]["resultado"] == "8-0"
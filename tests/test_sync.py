@@ -0,0 +1,100 @@
+# Sync incremental del historial contra el ledger (high-water mark, backfill con MAX_PAGES, exclusiones).
+import os, sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exclusions
+import game_ledger
+import standings_cascade_points_desc as standings
+
+PAGE_SIZE = 10
+(USER_A, TEAM_A), (USER_B, TEAM_B) = standings.LEAGUE_ORDER[0], standings.LEAGUE_ORDER[1]
+
+
+def _game(gid, when):
+    return {"id": str(gid), "game_mode": "LEAGUE", "display_date": when.strftime("%m/%d/%Y %H:%M:%S"),
+            "home_full_name": TEAM_A, "away_full_name": TEAM_B, "home_name": USER_A, "away_name": USER_B,
+            "home_display_result": "W", "away_display_result": "L", "home_runs": 5, "away_runs": 2}
+
+
+class FakeStore(standings.PageStore):
+    """PageStore que sirve páginas de un historial en memoria (más nuevo primero) y cuenta los pedidos."""
+    def __init__(self, history):
+        super().__init__()
+        self.history = history
+        self.requested = []
+
+    def get_many(self, keys):
+        out = {}
+        for user, page in keys:
+            self.requested.append((user, page))
+            games = self.history.get(user, [])
+            out[(user, page)] = games[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        return out
+
+
+def _history(n, start_id=1000):
+    base = standings.SINCE + timedelta(days=1)
+    games = [_game(start_id + i, base + timedelta(hours=i)) for i in range(n)]
+    return list(reversed(games))
+
+
+def _sync(ledger, history, users=(USER_A,)):
+    store = FakeStore(history)
+    standings.sync_histories(list(users), store, ledger=ledger)
+    return store
+
+
+def _no_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(exclusions, "EXCLUSIONS_FILE", str(tmp_path / "exclusions.json"))
+
+
+def test_first_sync_then_only_new_games(tmp_path, monkeypatch):
+    _no_rules(tmp_path, monkeypatch)
+    ledger = game_ledger.GameLedger(":memory:")
+    history = {USER_A: _history(25)}
+    _sync(ledger, history)
+    assert len(ledger.known_ids(USER_A)) == 25
+    assert ledger.get_sync_state([USER_A])[USER_A]["complete"] == 1
+
+    history[USER_A] = [_game(2001, datetime(2030, 1, 1)), _game(2000, datetime(2029, 12, 31))] + history[USER_A]
+    store = _sync(ledger, history)
+    assert store.requested == [(USER_A, 1)]          # high-water mark: con p1 alcanza
+    assert store.new_games == {USER_A: 2}
+    assert len(ledger.known_ids(USER_A)) == 27
+
+
+def test_capped_backfill_resumes_next_cycle(tmp_path, monkeypatch):
+    _no_rules(tmp_path, monkeypatch)
+    monkeypatch.setattr(standings, "MAX_PAGES", 2)
+    ledger = game_ledger.GameLedger(":memory:")
+    history = {USER_A: _history(45)}
+    _sync(ledger, history)
+    state = ledger.get_sync_state([USER_A])[USER_A]
+    assert len(ledger.known_ids(USER_A)) == 20
+    assert state["complete"] == 0 and state["next_page"] == 3
+
+    # Llega un juego nuevo: p1 trae lo nuevo y el backfill sigue en p3
+    history[USER_A] = [_game(9000, datetime(2030, 1, 1))] + history[USER_A]
+    store = _sync(ledger, history)
+    assert store.requested[0] == (USER_A, 1) and (USER_A, 3) in store.requested
+    assert (USER_A, 2) not in store.requested
+    # Cada ciclo baja MAX_PAGES - 1 páginas más (p1 siempre se pide): 46 juegos = 5 páginas + la vacía del final
+    for _ in range(3):
+        _sync(ledger, history)
+    assert len(ledger.known_ids(USER_A)) == 46
+    assert ledger.get_sync_state([USER_A])[USER_A]["complete"] == 1
+
+
+def test_excluded_games_stay_out_of_league_queries(tmp_path, monkeypatch):
+    rules = tmp_path / "exclusions.json"
+    rules.write_text('{"rules": [{"id": "1003", "reason": "test"}]}', encoding="utf-8")
+    monkeypatch.setattr(exclusions, "EXCLUSIONS_FILE", str(rules))
+    ledger = game_ledger.GameLedger(":memory:")
+    _sync(ledger, {USER_A: _history(5)})
+    rows = ledger.games_between([USER_A], "LEAGUE", standings.SINCE.strftime("%Y-%m-%d %H:%M:%S"),
+                                "9999-12-31 23:59:59")
+    ids = {r["id"] for r in rows}
+    assert "1003" not in ids and len(ids) == 4
+    assert "1003" in ledger.known_ids(USER_A)          # sigue en el ledger, sólo marcado
@@ -1,7 +1,9 @@
 # update_cache.py
 # Genera el cache usando compute_rows() y games_played_today_scl() del módulo standings_*
-import json, os, sys, time
-from datetime import datetime
+import copy, hashlib, json, os, re, sys, tempfile, time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
 # --- Import robusto del módulo principal ---
@@ -10,53 +12,411 @@ try:
 except Exception:
     import standings_cascade_points as standings  # fallback si el nombre no tiene _desc
 
+import standings_history
+from leagues import apply_fixture_results, apply_overrides
+from profiling import profiled
+
+try:
+    import projections  # NumPy: proyección de playoffs (sin NumPy se publica la tabla sin proyección)
+except ImportError:
+    projections = None
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CACHE_FILE = os.path.join(BASE_DIR, "standings_cache.json")
+SEMANAS_FILE = os.path.join(BASE_DIR, "data", "semanas.json")
+OVERRIDES_FILE = os.path.join(BASE_DIR, "data", "manual_overrides.json")
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "snapshots")
+GAMES_INDEX_FILE = os.getenv("GAMES_INDEX_FILE", os.path.join(BASE_DIR, "data", "games_index.json"))  # /api/team/<equipo>/games, /api/h2h
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(BASE_DIR, "data", "updater_metrics.json"))  # /metrics
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(BASE_DIR, "data", "history"))  # serie de la tabla (/api/history)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "10"))   # snapshots versionados que se conservan
+UPDATE_INTERVAL_SECONDS = int(os.getenv("UPDATE_INTERVAL_SECONDS", "300"))  # 5 min
 SCL = ZoneInfo("America/Santiago")
 
-# --- Lista de exclusiones manuales ---
-# Caso 1: excluir por string exacto (cuando games_today es lista de strings)
-EXCLUDE_STRINGS = {
-    "Yankees 0 - 0 Mets - 08-09-2025 - 9:40 pm (hora Chile)",
-}
-
-# Caso 2: excluir por reglas (cuando games_today es lista de objetos)
-EXCLUDE_RULES = [
-    {
-        "home_team": "Yankees",
-        "away_team": "Mets",
-        "home_score": 0,
-        "away_score": 0,
-        "ended_at_local_contains": "08-09-2025 - 9:40"
+# Exclusiones manuales: data/exclusions.json (ver exclusions.py). Se aplican al ingerir en el ledger,
+# así que la tabla, los juegos de hoy y el calendario ya vienen sin los juegos anulados.
+
+
+def _fixture_key(local, visitante):
+    return (standings.norm_team(local), standings.norm_team(visitante))
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def _week_order(k):
+    try:
+        return (0, int(k))
+    except ValueError:
+        return (1, k)
+
+def reconcile_fixtures(semanas, games):
+    """
+    Concilia TODOS los juegos de liga jugados contra TODAS las semanas del calendario.
+    - Índice (local, visitante) -> juegos del par (cronológico).
+    - Ventana de cada semana: semanas["fechas"][semana] = {"desde", "hasta"} ('YYYY-MM-DD', hora Chile,
+      ambos opcionales e inclusivos). Sin "desde", la semana empieza con el primer juego ya conciliado
+      (JUGADO con marcador) de la semana anterior que tenga alguno: un juego más viejo que eso
+      (semana que no está en el archivo, amistoso antiguo) no cae en un Pendiente.
+    - Los fixtures ya JUGADO con resultado "h-a" consumen primero un juego del par con ese marcador
+      dentro de su ventana; si ninguno calza, consumen igual el siguiente juego del par (no se publica).
+    - Los SIMULADO consumen el siguiente juego del par sólo si su semana tiene ventana explícita.
+    - Los Pendiente toman el siguiente juego del par dentro de su ventana y posterior al juego del
+      fixture anterior del mismo par, en orden (semana, posición).
+    `games`: GameRecords del más antiguo al más nuevo.
+    Devuelve {semana: {posición: {"local", "visitante", "resultado", "estado", "game_id"}}}.
+    """
+    by_pair = defaultdict(list)           # (local, visitante) -> juegos del par (cronológico)
+    for g in games:
+        by_pair[_fixture_key(g.home_team, g.away_team)].append(g)
+
+    weeks = sorted((semanas.get("semanas") or {}), key=_week_order)
+    fechas = semanas.get("fechas") or {}
+    windows = {}                          # semana -> (desde, hasta) explícitos (date o None)
+    for semana in weeks:
+        rango = fechas.get(semana) or {}
+        windows[semana] = (_parse_day(rango.get("desde")), _parse_day(rango.get("hasta")))
+
+    def in_window(g, semana, after=None):
+        desde, hasta = windows[semana]
+        if desde is None and hasta is None and after is None:
+            return True
+        if g.played_at is None:
+            return False
+        day = g.played_at.astimezone(SCL).date()
+        return ((desde is None or day >= desde) and (hasta is None or day <= hasta)
+                and (after is None or g.played_at > after))
+
+    # 1) JUGADO con marcador: anclas (juego exacto del fixture)
+    consumed = set()                      # ids de juegos ya asignados a un fixture
+    anchors = {}                          # (semana, posición) -> juego
+    for semana in weeks:
+        for pos, juego in enumerate(semanas["semanas"][semana]):
+            if (juego.get("estado") or "").strip().upper() != "JUGADO":
+                continue
+            pair = _fixture_key(juego.get("local"), juego.get("visitante"))
+            resultado = (juego.get("resultado") or "").strip()
+            for g in by_pair.get(pair, ()):
+                if g.id not in consumed and f"{g.home_runs}-{g.away_runs}" == resultado and in_window(g, semana):
+                    consumed.add(g.id)
+                    anchors[(semana, pos)] = g
+                    break
+
+    # 2) Resto, semana a semana: cada fixture toma el siguiente juego del par posterior al anterior
+    results = defaultdict(dict)
+    last_at = {}                          # par -> played_at del juego del fixture anterior del par
+    floor = None                          # primer juego conciliado de la última semana con anclas
+    for semana in weeks:
+        week_start = None if windows[semana][0] is not None else floor
+        for pos, juego in enumerate(semanas["semanas"][semana]):
+            pair = _fixture_key(juego.get("local"), juego.get("visitante"))
+            estado = (juego.get("estado") or "").strip().upper()
+            g = anchors.get((semana, pos))
+            if g is None and (estado in ("JUGADO", "PENDIENTE")
+                              or (estado == "SIMULADO" and windows[semana] != (None, None))):
+                after = max((t for t in (last_at.get(pair), week_start) if t is not None), default=None)
+                g = next((c for c in by_pair.get(pair, ())
+                          if c.id not in consumed and in_window(c, semana, after)), None)
+                if g is None:
+                    continue
+                consumed.add(g.id)
+                if estado == "PENDIENTE":
+                    results[semana][str(pos)] = {
+                        "local": juego.get("local"),
+                        "visitante": juego.get("visitante"),
+                        "resultado": f"{g.home_runs}-{g.away_runs}",
+                        "estado": "JUGADO",
+                        "game_id": g.id,
+                    }
+            if g is not None and g.played_at is not None:
+                last_at[pair] = max(last_at.get(pair, g.played_at), g.played_at)
+        week_anchors = [g.played_at for (s, _p), g in anchors.items() if s == semana and g.played_at is not None]
+        if week_anchors:
+            floor = min(week_anchors)
+    return dict(results)
+
+
+# ===== Snapshots atómicos y versionados del cache =====
+# Cada escritura: version = anterior + 1, content_hash = sha256 del contenido (sin version/fecha).
+# Se escribe a un temporal en el mismo directorio y se hace os.replace (atómico): un lector
+# de /api/full ve el archivo anterior completo o el nuevo completo, nunca uno a medias.
+SNAPSHOT_RE = re.compile(r"^standings_cache\.(\d+)\.json$")
+
+def _content_hash(payload):
+    content = {k: v for k, v in payload.items() if k not in ("version", "content_hash", "last_updated", "fetch_stats", "metrics")}
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _atomic_write_json(path, data):
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp crea con 0600
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+# Temporales que quedaron de una escritura cortada (proceso muerto entre mkstemp y os.replace).
+# Sólo se borran los más viejos que esto, para no pisar una escritura en curso de otro proceso.
+TMP_STALE_SECONDS = int(os.getenv("TMP_STALE_SECONDS", "600"))
+
+def clean_stale_tmp(leagues=None):
+    """Borra los .tmp-* abandonados en los directorios donde escribe el updater; devuelve cuántos."""
+    leagues = standings.all_leagues() if leagues is None else leagues
+    dirs = {os.path.dirname(METRICS_FILE)}
+    for lg in leagues.values():
+        paths = league_paths(lg)
+        dirs.update({os.path.dirname(paths["cache"]), paths["snapshots"],
+                     os.path.dirname(paths["games_index"]), paths["history"]})
+    cutoff = time.time() - TMP_STALE_SECONDS
+    removed = 0
+    for d in sorted(dirs):
+        try:
+            names = [n for n in os.listdir(d) if n.startswith(".tmp-")]
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(d, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    if removed:
+        print(f"Temporales abandonados borrados: {removed}.")
+    return removed
+
+def league_paths(league):
+    """
+    Archivos de una liga (cache, snapshots, semanas, overrides, games_index, history);
+    la de por defecto usa los de siempre.
+    """
+    if league.slug == standings.DEFAULT_LEAGUE:
+        return {"cache": CACHE_FILE, "snapshots": SNAPSHOT_DIR, "semanas": SEMANAS_FILE, "overrides": OVERRIDES_FILE,
+                "games_index": GAMES_INDEX_FILE, "history": HISTORY_DIR}
+    return {"cache": league.cache_file, "snapshots": league.snapshot_dir, "semanas": league.semanas_file,
+            "overrides": league.overrides_file, "games_index": league.games_index_file, "history": league.history_dir}
+
+_HISTORY = {}   # directorio -> HistoryStore (el escritor mantiene el último estado en memoria)
+
+def get_history(path):
+    if path not in _HISTORY:
+        _HISTORY[path] = standings_history.HistoryStore(path)
+    return _HISTORY[path]
+
+def all_usernames(leagues):
+    """Cuentas de todas las ligas, sin repetir: cada una se descarga una sola vez por ciclo."""
+    names = []
+    for lg in leagues.values():
+        names += lg.usernames()
+    return list(dict.fromkeys(names))
+
+def list_snapshots(snapshot_dir=None):
+    """[(version, path)] ordenados de la más antigua a la más nueva."""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    try:
+        names = os.listdir(snapshot_dir)
+    except OSError:
+        return []
+    found = []
+    for name in names:
+        m = SNAPSHOT_RE.match(name)
+        if m:
+            found.append((int(m.group(1)), os.path.join(snapshot_dir, name)))
+    return sorted(found)
+
+def _current_version(cache_file=None, snapshot_dir=None):
+    versions = [v for v, _ in list_snapshots(snapshot_dir)]
+    try:
+        with open(cache_file or CACHE_FILE, "r", encoding="utf-8") as f:
+            versions.append(int(json.load(f).get("version") or 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        pass
+    return max(versions, default=0)
+
+def write_cache_snapshot(payload, cache_file=None, snapshot_dir=None):
+    """
+    Publica `payload` como nueva versión: snapshot + swap atómico de CACHE_FILE + poda a SNAPSHOT_KEEP.
+    `cache_file` / `snapshot_dir`: los de otra liga (por defecto CACHE_FILE / SNAPSHOT_DIR).
+    """
+    cache_file, snapshot_dir = cache_file or CACHE_FILE, snapshot_dir or SNAPSHOT_DIR
+    payload = dict(payload, version=_current_version(cache_file, snapshot_dir) + 1, content_hash=_content_hash(payload))
+    os.makedirs(snapshot_dir, exist_ok=True)
+    _atomic_write_json(os.path.join(snapshot_dir, f"standings_cache.{payload['version']}.json"), payload)
+    _atomic_write_json(cache_file, payload)
+    for _v, path in list_snapshots(snapshot_dir)[:-SNAPSHOT_KEEP]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return payload
+
+def rollback_cache(version=None, league=None):
+    """
+    Vuelve a publicar el contenido de un snapshot anterior (por defecto, el penúltimo).
+    Se publica como versión NUEVA para que los clientes que cachean por versión lo vean.
+    `league`: slug de la liga (por defecto la de standings_cache.json).
+    """
+    leagues = standings.all_leagues()
+    if league and league not in leagues:
+        raise RuntimeError(f"No existe la liga {league}")
+    paths = league_paths(leagues[league or standings.DEFAULT_LEAGUE])
+    cache_file, snapshot_dir = paths["cache"], paths["snapshots"]
+    snaps = list_snapshots(snapshot_dir)
+    if version is None:
+        if len(snaps) < 2:
+            raise RuntimeError("No hay un snapshot anterior al que volver")
+        path = snaps[-2][1]
+    else:
+        path = dict(snaps).get(int(version))
+        if not path:
+            raise RuntimeError(f"No existe el snapshot {version}")
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    restored_from = payload.pop("version", None)
+    payload.pop("content_hash", None)
+    payload = write_cache_snapshot(dict(payload, restored_from=restored_from), cache_file, snapshot_dir)
+    get_history(paths["history"]).append(payload["standings"])
+    print(f"Cache restaurado desde la versión {restored_from} (nueva versión {payload['version']}).")
+    return payload
+
+
+# Funciones a llamar después de un ciclo que publicó algo (app.py: el líder publica el payload compartido)
+PUBLISH_HOOKS = []
+
+# ===== Métricas del ciclo =====
+# Van a METRICS_FILE al final de CADA ciclo (también los que no publican nada o fallan);
+# app.py las expone en /metrics.
+_CYCLES = {"ok": 0, "error": 0}
+
+@contextmanager
+def _phase(phases, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Con varias ligas cada fase suma lo de todas
+        phases[name] = round(phases.get(name, 0) + time.perf_counter() - t0, 4)
+
+def _cycle_metrics(store, phases, started):
+    return {
+        "generated_at": time.time(),
+        "duration_seconds": round(time.perf_counter() - started, 4),
+        "phases": dict(phases),
+        "cycles": dict(_CYCLES),
+        "upstream": standings.get_client().snapshot(),
+        "pages": [dict(t, user=u, page=p) for (u, p), t in sorted(store.trace.items())] if store else [],
     }
-]
-
-def _should_exclude_game(g):
-    # Si es string: comparación exacta contra EXCLUDE_STRINGS
-    if isinstance(g, str):
-        return g.strip() in EXCLUDE_STRINGS
-
-    # Si es objeto: coteja campos si existen
-    if isinstance(g, dict):
-        for rule in EXCLUDE_RULES:
-            ok = True
-            for k, v in rule.items():
-                if k == "ended_at_local_contains":
-                    if v not in (g.get("ended_at_local") or ""):
-                        ok = False
-                        break
-                else:
-                    if g.get(k) != v:
-                        ok = False
-                        break
-            if ok:
-                return True
-    return False
-
-
-def update_data_cache():
+
+def _write_metrics(store, phases, started):
+    try:
+        os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+        _atomic_write_json(METRICS_FILE, _cycle_metrics(store, phases, started))
+    except Exception as e:
+        print(f"[WARN] No se pudieron escribir las métricas: {e}")
+
+def _published_state(cache_file=None):
+    """(content_hash, mtime) del cache publicado, o (None, 0) si no hay."""
+    cache_file = cache_file or CACHE_FILE
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("content_hash"), os.path.getmtime(cache_file)
+    except (OSError, ValueError, AttributeError):
+        return None, 0
+
+def _pending_usernames(semanas, fixture_results, league):
+    """Cuentas (principal + alias) de equipos con fixture Pendiente en la semana actual."""
+    semana = str(semanas.get("semana_actual") or "")
+    resolved = fixture_results.get(semana) or {}
+    owner = {standings.norm_team(t): (u, t) for u, t in league.order}
+    teams = set()
+    for pos, juego in enumerate((semanas.get("semanas") or {}).get(semana) or []):
+        if (juego.get("estado") or "").strip().upper() == "PENDIENTE" and str(pos) not in resolved:
+            teams.update(standings.norm_team(juego.get(k)) for k in ("local", "visitante"))
+    return set(league.usernames([owner[t] for t in teams if t in owner]))
+
+
+def _league_payload(league, store, ts, phases):
+    """
+    (payload sin publicar, índice de juegos, cuentas con fixture Pendiente) de una liga,
+    desde el ledger ya sincronizado.
+    """
+    paths = league_paths(league)
+    semanas_file = paths["semanas"]
+
+    # 1) Tabla (dedup + filtro + W/L son consultas al ledger)
+    with _phase(phases, "aggregate"):
+        rows = standings.compute_rows(store=store, league=league)
+
+    # 2) Juegos de HOY (hora Chile)
+    with _phase(phases, "games_today"):
+        games_today = standings.games_played_today_scl(store=store, league=league)
+
+    # 3) Conciliar el calendario completo (todas las semanas) con el historial del ledger
+    fixture_results = {}
+    semanas = {}
+    with _phase(phases, "reconcile"):
+        if semanas_file and os.path.exists(semanas_file):
+            with open(semanas_file, "r", encoding="utf-8") as f:
+                semanas = json.load(f)
+            fixture_results = reconcile_fixtures(semanas, standings.played_league_games(store=store, league=league))
+
+    # 3b) Proyección de fin de temporada (Monte Carlo) sobre el calendario tal como lo publica la web:
+    #     conciliados y después manual_overrides.json; misma tabla + calendario => misma proyección
+    projection = None
+    if projections is not None:
+        with _phase(phases, "projections"):
+            try:
+                published = apply_fixture_results(copy.deepcopy(semanas), fixture_results)
+                if semanas and paths["overrides"] and os.path.exists(paths["overrides"]):
+                    with open(paths["overrides"], "r", encoding="utf-8") as f:
+                        apply_overrides(published, json.load(f))
+                projection = projections.simulate(rows, published)
+            except Exception as e:
+                print(f"[WARN] Proyección no disponible ({league.slug}): {e}")
+
+    # 3d) Índices por equipo / enfrentamiento (archivo aparte: /api/full no crece)
+    with _phase(phases, "index"):
+        games_index = standings.build_game_index(standings.get_ledger(league.since), league=league)
+
+    # 4) Cache (sólo lo que necesita la web)
+    payload = {
+        "standings": rows,
+        "games_today": games_today,
+        "fixture_results": fixture_results,
+        "projections": projection,
+        "last_updated": ts,
+        "fetch_stats": dict(store.stats, failed_pages=len(store.failed),
+                            upstream=dict(standings.get_client().stats),
+                            breaker=standings.get_client().breaker.state),
+    }
+    return payload, games_index, _pending_usernames(semanas, fixture_results, league)
+
+@profiled("update_data_cache")
+def update_data_cache(users=None, cycle=None, force=False):
+    """
+    Recalcula y publica el cache de cada liga (la de por defecto + data/leagues/).
+    Las cuentas se sincronizan una sola vez para todas las ligas; luego cada liga es sólo consultas.
+    `users`: cuentas a consultar en la API (None = todas); el resto se toma tal cual del ledger.
+    `cycle`: dict que se completa con lo observado (new_games, last_played, pending, opponents) para el scheduler.
+    Con `users`, una liga sólo se publica si cambió su contenido, si `force` o si su último cache
+    tiene más de UPDATE_INTERVAL_SECONDS.
+    """
     ts = datetime.now(SCL).strftime('%Y-%m-%d %H:%M:%S')
     print(f"[{ts}] Iniciando actualización del cache...")
+    started = time.perf_counter()
+    phases = {}
+    store = None
 
     try:
         # Validaciones mínimas para que el error sea claro si faltara algo
@@ -65,43 +425,218 @@ def update_data_cache():
         if not hasattr(standings, "games_played_today_scl"):
             raise AttributeError("El módulo no define games_played_today_scl()")
 
-        # 1) Tabla
-        rows = standings.compute_rows()
+        leagues = standings.all_leagues()
+        usernames = all_usernames(leagues)
+
+        # Store de páginas del ciclo: todas las ligas comparten las mismas descargas
+        skip = () if users is None else set(usernames) - set(users)
+        store = standings.PageStore(skip=skip)
+
+        # 0) Sync de historiales hacia el ledger (descarga + parseo + ingesta), desde el inicio más antiguo
+        ledger = standings.get_ledger(min(lg.since for lg in leagues.values()))
+        with _phase(phases, "fetch"):
+            standings.sync_histories(usernames, store, ledger=ledger)
 
-        # 2) Juegos de HOY (hora Chile)
-        games_today = standings.games_played_today_scl()
+        # 1) - 4) Payload de cada liga; una liga adicional que falla no frena a las demás
+        built, pending = [], set()
+        for lg in leagues.values():
+            try:
+                payload, games_index, lg_pending = _league_payload(lg, store, ts, phases)
+            except Exception as e:
+                if lg.slug == standings.DEFAULT_LEAGUE:
+                    raise
+                print(f"ERROR en la liga {lg.slug}: {e}")
+                continue
+            built.append((lg, payload, games_index))
+            pending |= lg_pending
 
-        # 3) Aplicar exclusiones manuales
-        games_today = [g for g in games_today if not _should_exclude_game(g)]
+        if cycle is not None:
+            cycle["new_games"] = dict(store.new_games)
+            cycle["last_played"] = ledger.last_played(usernames)
+            cycle["pending"] = pending
+            # Cuentas miembro del otro lado de los juegos nuevos: su historial también tiene el juego
+            cycle["opponents"] = {u for u in usernames if standings.player_key(u) in store.new_players}
 
-        # 4) Escribir cache (sólo lo que necesita la web)
-        payload = {
-            "standings": rows,
-            "games_today": games_today,
-            "last_updated": ts
-        }
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
+        # 5) Publicar
+        t0 = time.perf_counter()
+        published = 0
+        for lg, payload, games_index in built:
+            paths = league_paths(lg)
+            cache_file, snapshot_dir, index_file = paths["cache"], paths["snapshots"], paths["games_index"]
+            published_hash, published_at = _published_state(cache_file)
+            if (users is not None and not force and published_hash == _content_hash(payload)
+                    and time.time() - published_at < UPDATE_INTERVAL_SECONDS):
+                print(f"Liga {lg.slug}: sin cambios, no se publica.")
+                continue
+            # El índice va antes que el cache: cuando la web ve la versión nueva, su índice ya está
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            _atomic_write_json(index_file, dict(games_index, last_updated=ts))
+            payload = write_cache_snapshot(payload, cache_file, snapshot_dir)
+            published += 1
+            print(f"Liga {lg.slug}: versión {payload['version']}.")
+            # Serie histórica: sólo agrega un registro si la tabla cambió
+            try:
+                get_history(paths["history"]).append(payload["standings"])
+            except Exception as e:
+                print(f"[WARN] No se pudo registrar la historia de {lg.slug}: {e}")
+        phases["write"] = round(time.perf_counter() - t0, 4)
+        _CYCLES["ok"] += 1
+        _write_metrics(store, phases, started)
+        if published:
+            for hook in PUBLISH_HOOKS:
+                try:
+                    hook()
+                except Exception as e:
+                    print(f"[WARN] Hook de publicación falló: {e}")
 
+        print(f"Descargas API: {store.stats['requests']} (evitadas: {store.stats['avoided']}, cuentas sin consultar: {store.stats['skipped']})")
         print("Actualización completada exitosamente.")
         return True
     except Exception as e:
+        _CYCLES["error"] += 1
         print(f"ERROR durante la actualización del cache: {e}")
+        _write_metrics(store, phases, started)
         return False
 
 
+# ===== Polling adaptativo por cuenta =====
+# En vez de consultar a todos cada UPDATE_INTERVAL_SECONDS, cada cuenta tiene su próxima consulta:
+# - activa (jugó hace menos de ACTIVE_WINDOW_SECONDS): cada ACTIVE_POLL_SECONDS
+# - con fixture Pendiente en la semana actual: desde ACTIVE_POLL_SECONDS, duplicando en cada
+#   consulta sin juegos nuevos, hasta PENDING_POLL_MAX_SECONDS
+# - inactiva: desde IDLE_POLL_MIN_SECONDS, duplicando, hasta IDLE_POLL_MAX_SECONDS
+# Ninguna espera pasa del inicio del próximo día (DAY_WINDOW_MODE: "sports" = 06:00, "calendar" = 00:00),
+# y el cambio de día fuerza una publicación para que games_today se renueve.
+ACTIVE_POLL_SECONDS = int(os.getenv("ACTIVE_POLL_SECONDS", "60"))
+ACTIVE_WINDOW_SECONDS = int(os.getenv("ACTIVE_WINDOW_SECONDS", "3600"))      # 1 h
+PENDING_POLL_MAX_SECONDS = int(os.getenv("PENDING_POLL_MAX_SECONDS", "600"))  # 10 min
+IDLE_POLL_MIN_SECONDS = int(os.getenv("IDLE_POLL_MIN_SECONDS", "300"))        # 5 min
+IDLE_POLL_MAX_SECONDS = int(os.getenv("IDLE_POLL_MAX_SECONDS", "3600"))       # 1 h
+DAY_START_HOUR = 6 if standings.DAY_WINDOW_MODE == "sports" else 0
+
+def _day_key(now):
+    """(fecha calendario, fecha del día deportivo) en Chile; cambia en cualquiera de los dos cortes."""
+    local = datetime.fromtimestamp(now, SCL)
+    return local.date(), (local - timedelta(hours=DAY_START_HOUR)).date()
+
+def _next_day_start(now):
+    local = datetime.fromtimestamp(now, SCL)
+    start = local.replace(hour=DAY_START_HOUR, minute=0, second=0, microsecond=0)
+    if start <= local:
+        start = (start + timedelta(days=1)).replace(hour=DAY_START_HOUR)
+    return start.timestamp()
+
+def _utc_ts(played_at):
+    try:
+        return datetime.strptime(played_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class PollScheduler:
+    """Próxima consulta y racha sin juegos nuevos de cada cuenta. Al arrancar, todas están vencidas."""
+    def __init__(self, usernames, now=None):
+        now = time.time() if now is None else now
+        self.next_at = {u: now for u in usernames}
+        self.misses = {u: 0 for u in usernames}
+        self.day = _day_key(now)
+
+    def track(self, usernames, now):
+        """Agrega como vencidas las cuentas nuevas (p. ej. de una liga recién agregada)."""
+        for u in usernames:
+            if u not in self.next_at:
+                self.next_at[u] = now
+                self.misses[u] = 0
+
+    def due(self, now):
+        return [u for u, t in self.next_at.items() if t <= now]
+
+    def day_changed(self, now):
+        day = _day_key(now)
+        changed, self.day = day != self.day, day
+        return changed
+
+    def seconds_until_next(self, now):
+        nxt = min(list(self.next_at.values()) + [_next_day_start(now)])
+        return max(0.0, nxt - now)
+
+    def interval(self, username, last_played, pending, now):
+        last = _utc_ts(last_played.get(username))
+        if last is not None and now - last <= ACTIVE_WINDOW_SECONDS:
+            return ACTIVE_POLL_SECONDS
+        backoff = 2 ** min(self.misses[username], 16)
+        if username in pending:
+            return min(ACTIVE_POLL_SECONDS * backoff, PENDING_POLL_MAX_SECONDS)
+        return min(IDLE_POLL_MIN_SECONDS * backoff, IDLE_POLL_MAX_SECONDS)
+
+    def record(self, polled, cycle, now):
+        """
+        Reprograma las cuentas consultadas según lo que dejó update_data_cache en `cycle`. Los rivales
+        miembro de un juego nuevo que no se consultaron quedan vencidos ya: ambos lados del resultado
+        llegan a la tabla en el mismo minuto.
+        """
+        new_games = cycle.get("new_games") or {}
+        last_played = cycle.get("last_played") or {}
+        pending = cycle.get("pending") or set()
+        day_start = _next_day_start(now)
+        for u in polled:
+            if u not in new_games:
+                # Falló la consulta: reintento sin alargar la racha
+                wait = min(self.interval(u, last_played, pending, now), IDLE_POLL_MIN_SECONDS)
+            else:
+                self.misses[u] = 0 if new_games[u] else self.misses[u] + 1
+                wait = self.interval(u, last_played, pending, now)
+            self.next_at[u] = min(now + wait, day_start)
+        for u in (cycle.get("opponents") or set()) - set(polled):
+            if u in self.next_at:
+                self.misses[u] = 0
+                self.next_at[u] = min(self.next_at[u], now)
+
+def run_adaptive_loop():
+    clean_stale_tmp()
+    scheduler = PollScheduler(all_usernames(standings.all_leagues()))
+    while True:
+        now = time.time()
+        scheduler.track(all_usernames(standings.all_leagues()), now)
+        force = scheduler.day_changed(now)
+        due = scheduler.due(now)
+        if due or force:
+            cycle = {}
+            update_data_cache(users=due, cycle=cycle, force=force)
+            scheduler.record(due, cycle, time.time())
+        wait = scheduler.seconds_until_next(time.time())
+        print(f"Próxima consulta en {wait:.0f} s.")
+        try:
+            time.sleep(max(1.0, wait))
+        except KeyboardInterrupt:
+            print("Detenido por el usuario.")
+            break
+
+
 def _run_once_then_exit():
+    clean_stale_tmp()
     ok = update_data_cache()
     sys.exit(0 if ok else 1)
 
 
 if __name__ == "__main__":
+    # Modo 0: volver al snapshot anterior (o a uno puntual: --rollback 12; otra liga: --league <slug>)
+    if "--rollback" in sys.argv:
+        i = sys.argv.index("--rollback")
+        version = sys.argv[i + 1] if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("--") else None
+        league = sys.argv[sys.argv.index("--league") + 1] if "--league" in sys.argv else None
+        rollback_cache(version, league)
+        sys.exit(0)
+
     # Modo 1: una sola pasada (útil en Render antes de levantar la web)
     if "--once" in sys.argv or os.getenv("RUN_ONCE") == "1":
         _run_once_then_exit()
 
-    # Modo 2: bucle (local/worker)
-    UPDATE_INTERVAL_SECONDS = int(os.getenv("UPDATE_INTERVAL_SECONDS", "300"))  # 5 min
+    # Modo 2: bucle adaptativo por cuenta (por defecto)
+    if os.getenv("SCHEDULER", "adaptive") == "adaptive":
+        run_adaptive_loop()
+        sys.exit(0)
+
+    # Modo 3: bucle fijo (SCHEDULER=fixed): todos cada UPDATE_INTERVAL_SECONDS
     while True:
         update_data_cache()
         print(f"Esperando {UPDATE_INTERVAL_SECONDS} segundos para la próxima actualización...")
@@ -0,0 +1,202 @@
+# upstream_client.py
+# Cliente HTTP para la API de MLB The Show, pensado para no empeorar las cosas cuando la API anda mal:
+# - TokenBucket:    límite global de requests/segundo (compartido por todos los hilos)
+# - backoff:        exponencial con jitter entre reintentos; respeta Retry-After (429/503)
+# - CircuitBreaker: tras N fallos seguidos deja de llamar por un rato (falla al instante)
+import random, threading, time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from metrics import Histogram
+
+
+class UpstreamError(Exception):
+    """La API no respondió bien después de los reintentos (`status` = último código HTTP, `attempts` = intentos)."""
+    status = None
+    attempts = 0
+
+class CircuitOpenError(UpstreamError):
+    """El circuito está abierto: no se llamó a la API."""
+
+
+class TokenBucket:
+    """`rate` tokens por segundo, hasta `burst` acumulados. acquire() bloquea hasta tener uno."""
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def defer(self, seconds):
+        """Nadie toma tokens durante `seconds` (ej: Retry-After de un 429)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold fallos seguidos) -> open -> (reset_seconds) -> half-open.
+    En half-open pasa UNA llamada de prueba: si sale bien se cierra, si falla vuelve a open.
+    """
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def _retry_after_seconds(value):
+    """Retry-After en segundos (acepta segundos o fecha HTTP); None si no viene o no se entiende."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class UpstreamClient:
+    """
+    GET con límite de tasa, reintentos y circuit breaker. Thread-safe: una instancia por proceso.
+    Reintenta errores de red, timeouts, 429 y 5xx; el resto de 4xx falla de inmediato.
+    `latency` = histograma por intento; stats["status"] = intentos por código ("error" = sin respuesta).
+    La Response devuelta trae `attempts` y `total_seconds` (con esperas incluidas).
+    """
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, session, rate=5.0, burst=10, attempts=3, backoff_base=0.5, backoff_max=8.0,
+                 max_retry_after=60.0, failure_threshold=5, reset_seconds=60.0, timeout=(5, 20)):
+        self.session = session
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.attempts = max(1, int(attempts))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "short_circuited": 0, "status": {}}
+        self.latency = Histogram()
+        self._lock = threading.Lock()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _observe(self, seconds, status):
+        self.latency.observe(seconds)
+        with self._lock:
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+
+    def snapshot(self):
+        """Contadores + histograma de latencia (dict JSON)."""
+        with self._lock:
+            stats = dict(self.stats, status=dict(self.stats["status"]))
+        return dict(stats, latency=self.latency.snapshot(), breaker=self.breaker.state)
+
+    def _backoff(self, attempt):
+        # "full jitter": uniforme entre 0 y el tope exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, url, params=None, headers=None):
+        """Response con status 2xx/3xx (ej: 304 a un pedido condicional). Lanza CircuitOpenError o UpstreamError."""
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"circuito abierto ({url})")
+        last = None
+        started = time.perf_counter()
+        for attempt in range(self.attempts):
+            if attempt:
+                self._count("retries")
+            self.bucket.acquire()
+            self._count("calls")
+            t0 = time.perf_counter()
+            try:
+                r = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                self._observe(time.perf_counter() - t0, "error")
+                last = e
+                if attempt < self.attempts - 1:
+                    time.sleep(self._backoff(attempt))
+                continue
+            self._observe(time.perf_counter() - t0, r.status_code)
+            if r.status_code < 400:
+                self.breaker.success()
+                r.attempts, r.total_seconds = attempt + 1, time.perf_counter() - started
+                return r
+            last = UpstreamError(f"HTTP {r.status_code}")
+            last.status = r.status_code
+            if r.status_code not in self.RETRY_STATUS:
+                # Error del pedido, no de la API: no cuenta para el circuito
+                self.breaker.success()
+                last.attempts = attempt + 1
+                raise last
+            wait = self._backoff(attempt)
+            retry_after = _retry_after_seconds(r.headers.get("Retry-After"))
+            if r.status_code == 429:
+                self._count("throttled")
+            if retry_after is not None:
+                # Todos los hilos esperan, no sólo este (a lo más max_retry_after: un Retry-After
+                # de horas no puede dejar bloqueado al updater)
+                self.bucket.defer(min(retry_after, self.max_retry_after))
+                if retry_after > self.max_retry_after:
+                    break
+                wait = max(wait, retry_after)
+            if attempt < self.attempts - 1:
+                time.sleep(wait)
+        self._count("failures")
+        self.breaker.failure()
+        err = last if isinstance(last, UpstreamError) else UpstreamError(str(last))
+        err.attempts = attempt + 1
+        raise err